@@ -0,0 +1,315 @@
+"""Two-level cache: a small LRU in every process in front of a shared cache.
+
+``LOCATION`` names the shared cache in ``CACHES``. Reads are served from
+the process's own LRU (``LOCAL_MAX_ENTRIES`` entries, each kept at most
+``LOCAL_TIMEOUT`` seconds) and go to the shared cache only on a miss.
+
+Writes go to the shared cache and are broadcast through it: keys are
+hashed into ``BUCKETS`` buckets, and a write stores a fresh token under
+the bucket of every key it changed. At most once per ``SYNC_INTERVAL``
+seconds a process reads all the tokens and drops its entries in the
+buckets whose token changed; if the tokens are gone because the shared
+cache was cleared, it drops its whole LRU. A value another process has
+overwritten is therefore served for at most ``SYNC_INTERVAL`` seconds,
+and never for longer than ``LOCAL_TIMEOUT``. Filling a key right after
+a miss is not broadcast, so filling the cache costs no extra writes.
+
+A token is set rather than incremented, so writes from several processes
+cannot lose each other even on shared backends without atomic ``incr()``,
+such as the file cache.
+
+``add()`` goes straight to the shared cache, and the page cache locks and
+feed generations rely on it being atomic. Django's file cache checks for
+the key and then writes it, so several processes can all succeed;
+``FileCache`` is a file cache whose ``add()`` holds a lock instead.
+"""
+import os
+import pickle
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+from core import metrics
+
+EPOCH_KEY = 'two-level:epoch'
+BUCKET_KEY = 'two-level:bucket:{}'
+BUCKETS = 64
+ADD_LOCK = 'add.lock'
+
+_MISSING = object()
+
+# One local tier per process and cache, shared by the threads; Django
+# creates a cache backend object per thread.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def bucket(key):
+    return zlib.crc32(key.encode()) % BUCKETS
+
+
+def _token():
+    return uuid.uuid4().hex
+
+
+class LocalStore:
+    """The process tier: pickled values in LRU order with expiry times."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.synced = float('-inf')
+        self.tokens = None
+        # Keys the shared cache did not have since the last sync.
+        self.missed = set()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, pickled = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return _MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout):
+        if timeout <= 0:
+            self.discard([key])
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, pickled)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def discard_buckets(self, buckets):
+        with self.lock:
+            for key in [key for key in self.entries
+                        if bucket(key) in buckets]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoLevelCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.sync_interval = options.get('SYNC_INTERVAL', 0.5)
+        with _stores_lock:
+            self.local = _stores.setdefault(
+                location, LocalStore(options.get('LOCAL_MAX_ENTRIES', 1000))
+            )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _full_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def _sync(self):
+        local = self.local
+        if time.monotonic() - local.synced < self.sync_interval:
+            return
+        # One thread reads the tokens; the others keep serving meanwhile.
+        if not local.sync_lock.acquire(blocking=False):
+            return
+        try:
+            local.synced = time.monotonic()
+            local.missed = set()
+            self._apply_tokens()
+        finally:
+            local.sync_lock.release()
+
+    def _apply_tokens(self):
+        local = self.local
+        keys = [BUCKET_KEY.format(number) for number in range(BUCKETS)]
+        tokens = self.shared.get_many([EPOCH_KEY] + keys)
+        if EPOCH_KEY not in tokens or local.tokens is None:
+            # First sync, or the shared cache was cleared or culled.
+            local.clear()
+            self.shared.add(EPOCH_KEY, _token(), None)
+        else:
+            local.discard_buckets({
+                number for number, key in enumerate(keys)
+                if key not in tokens or tokens[key] != local.tokens.get(key)
+            })
+        # A missing token is a lost broadcast and drops its bucket; give it
+        # a value so that the next sync can tell.
+        for key in keys:
+            if key not in tokens:
+                token = _token()
+                if self.shared.add(key, token, None):
+                    tokens[key] = token
+        local.tokens = tokens
+
+    def _written(self, keys, fill=False):
+        """Tell the other processes to drop their copies of ``keys``.
+
+        With ``fill``, keys this process has just missed are skipped: the
+        shared cache did not have them, so nobody holds a current copy.
+        """
+        if fill:
+            filled = self.local.missed.intersection(keys)
+            self.local.missed.difference_update(filled)
+            keys = [key for key in keys if key not in filled]
+        if not keys:
+            return
+        token = _token()
+        written = {BUCKET_KEY.format(number): token
+                   for number in {bucket(key) for key in keys}}
+        current = self.shared.get_many(list(written))
+        self.shared.set_many(written, None)
+        # Buckets nobody else wrote since the last sync keep our entries.
+        seen = self.local.tokens
+        if seen is not None:
+            for key in written:
+                if key in current and current[key] == seen.get(key):
+                    seen[key] = token
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        full_key = self._full_key(key, version)
+        value = self.local.get(full_key)
+        if value is not _MISSING:
+            metrics.inc(metrics.CACHE, 'local', 'hit')
+            return value
+        metrics.inc(metrics.CACHE, 'local', 'miss')
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self.local.missed.add(full_key)
+            return default
+        self.local.set(full_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(self._full_key(key, version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key in missing:
+                full_key = self._full_key(key, version)
+                if key in fetched:
+                    self.local.set(full_key, fetched[key], self.local_timeout)
+                else:
+                    self.local.missed.add(full_key)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._sync()
+        self.shared.set(key, value, timeout, version=version)
+        full_key = self._full_key(key, version)
+        self.local.set(full_key, value, self._local_timeout(timeout))
+        self._written([full_key], fill=True)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._sync()
+        failed = self.shared.set_many(data, timeout, version=version)
+        local_timeout = self._local_timeout(timeout)
+        for key, value in data.items():
+            if key not in failed:
+                self.local.set(self._full_key(key, version), value,
+                               local_timeout)
+        self._written([self._full_key(key, version) for key in data],
+                      fill=True)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._sync()
+        if not self.shared.add(key, value, timeout, version=version):
+            return False
+        # The key was absent, so other processes can only hold a copy that
+        # has expired in the shared cache, and LOCAL_TIMEOUT bounds that.
+        self.local.set(self._full_key(key, version), value,
+                       self._local_timeout(timeout))
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._local_timeout(timeout) <= 0:
+            self.local.discard([self._full_key(key, version)])
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._sync()
+        value = self.shared.incr(key, delta, version=version)
+        full_key = self._full_key(key, version)
+        self.local.set(full_key, value, self.local_timeout)
+        self._written([full_key])
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def delete(self, key, version=None):
+        self._sync()
+        full_key = self._full_key(key, version)
+        self.local.discard([full_key])
+        self.shared.delete(key, version=version)
+        self._written([full_key])
+
+    def delete_many(self, keys, version=None):
+        self._sync()
+        full_keys = [self._full_key(key, version) for key in keys]
+        self.local.discard(full_keys)
+        self.shared.delete_many(keys, version=version)
+        self._written(full_keys)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+class FileCache(FileBasedCache):
+    """``FileBasedCache`` whose ``add()`` is atomic across processes.
+
+    The check and the write run under an exclusive lock on ``ADD_LOCK`` in
+    the cache directory, which the OS releases if its holder dies.
+    ``clear()`` only removes cache files and leaves the lock file alone.
+    """
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        with open(os.path.join(self._dir, ADD_LOCK), 'a') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                return super().add(key, value, timeout, version)
+            finally:
+                locks.unlock(lock)
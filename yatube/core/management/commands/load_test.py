@@ -0,0 +1,279 @@
+import io
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+import django
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY, get_user_model)
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connections
+
+from core import timing
+from posts.models import Group, Post
+from yatube.wsgi import application
+
+User = get_user_model()
+
+MIX = {'index': 40, 'group': 20, 'profile': 20, 'detail': 15, 'create': 5}
+
+_errors = threading.local()
+
+
+def count_lock_errors(sender, **kwargs):
+    error = sys.exc_info()[1]
+    if isinstance(error, OperationalError) and 'locked' in str(error):
+        _errors.locked = getattr(_errors, 'locked', 0) + 1
+
+
+got_request_exception.connect(count_lock_errors)
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in MIX or not weight.isdigit():
+            raise CommandError(f'Неверная смесь запросов: {part!r}')
+        mix[kind] = int(weight)
+    return mix
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class VirtualUser:
+    """One client of the WSGI application, with its own cookies."""
+
+    def __init__(self, application, host, session_key=None):
+        self.application = application
+        self.host = host
+        self.cookies = {}
+        if session_key:
+            self.cookies['sessionid'] = session_key
+
+    def request(self, method, url, data=None):
+        path, _, query = url.partition('?')
+        body = urlencode(data).encode() if data else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'HTTP_HOST': self.host,
+            'CONTENT_LENGTH': str(len(body)),
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'wsgi.input': io.BytesIO(body),
+        }
+        if self.cookies:
+            environ['HTTP_COOKIE'] = '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items()
+            )
+        if 'csrftoken' in self.cookies:
+            environ['HTTP_X_CSRFTOKEN'] = self.cookies['csrftoken']
+        setup_testing_defaults(environ)
+        status = []
+
+        def start_response(line, headers, exc_info=None):
+            status.append(int(line.split()[0]))
+            for name, value in headers:
+                if name.lower() == 'set-cookie':
+                    for morsel in SimpleCookie(value).values():
+                        self.cookies[morsel.key] = morsel.value
+
+        result = self.application(environ, start_response)
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0]
+
+
+def run_worker(plan):
+    """Replay the request mix; returns samples and lock errors."""
+    rng = random.Random(plan['seed'])
+    reader = VirtualUser(application, plan['host'])
+    writer = VirtualUser(application, plan['host'], plan['session'])
+    kinds = list(plan['mix'])
+    if plan['session']:
+        # Picks up the CSRF cookie that the POSTs send back.
+        writer.request('GET', '/create/')
+    elif 'create' in kinds:
+        kinds.remove('create')
+    weights = [plan['mix'][kind] for kind in kinds]
+    targets = plan['targets']
+    samples = []
+    _errors.locked = 0
+    deadline = time.monotonic() + plan['duration']
+    while (len(samples) < plan['requests'] if plan['requests']
+           else time.monotonic() < deadline):
+        kind = rng.choices(kinds, weights)[0]
+        client = writer if (plan['session'] and (
+            kind == 'create' or rng.random() < plan['logged_in']
+        )) else reader
+        if kind == 'create':
+            method, path = 'POST', '/create/'
+            data = {'text': f'Пост нагрузочного теста {rng.random()}'}
+        else:
+            method, data = 'GET', None
+            path = rng.choice(targets[kind])
+        started = time.perf_counter()
+        status = client.request(method, path, data)
+        samples.append((kind, (time.perf_counter() - started) * 1000,
+                        status))
+    connections.close_all()
+    return samples, _errors.locked
+
+
+def init_process():
+    django.setup()
+    # One log line per request would be timed along with the views; the
+    # pool's processes exit when the test is over.
+    timing.logger.setLevel(logging.WARNING)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест приложения WSGI без сети: смесь чтений и '
+            'записей из пула потоков или процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--mode', choices=('thread', 'process'),
+                            default='thread')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Секунд на каждого воркера.')
+        parser.add_argument('--requests', type=int, default=0,
+                            help='Запросов на воркера вместо --duration.')
+        parser.add_argument(
+            '--mix', type=parse_mix, default=MIX,
+            help='Веса запросов, например index=40,group=20,profile=20,'
+                 'detail=15,create=5.',
+        )
+        parser.add_argument('--logged-in', type=float, default=0.2,
+                            help='Доля чтений от вошедшего пользователя.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--host', default='localhost',
+                            help='Заголовок Host; должен быть в '
+                                 'ALLOWED_HOSTS.')
+        parser.add_argument('--output', help='Записать итоги в JSON.')
+
+    def handle(self, *args, **options):
+        targets = self.targets()
+        sessions = self.sessions(options['workers'])
+        plans = [{
+            'seed': options['seed'] + number,
+            'session': sessions[number],
+            'mix': options['mix'],
+            'targets': targets,
+            'logged_in': options['logged_in'],
+            'duration': options['duration'],
+            'requests': options['requests'],
+            'host': options['host'],
+        } for number in range(options['workers'])]
+        if options['mode'] == 'process':
+            connections.close_all()
+            pool = ProcessPoolExecutor(options['workers'],
+                                       initializer=init_process)
+        else:
+            pool = ThreadPoolExecutor(options['workers'])
+        started = time.perf_counter()
+        with pool, timing.quiet():
+            outcomes = list(pool.map(run_worker, plans))
+        elapsed = time.perf_counter() - started
+        summary = self.summarize(outcomes, elapsed, options)
+        self.report(summary)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(summary, stream, ensure_ascii=False, indent=2)
+
+    def targets(self):
+        groups = list(Group.objects.order_by('-posts_count', 'pk')
+                      .values_list('slug', flat=True)[:50])
+        authors = list(User.objects.filter(post_stats__posts_count__gt=0)
+                       .order_by('-post_stats__posts_count', 'pk')
+                       .values_list('username', flat=True)[:50])
+        posts = list(Post.objects.order_by('-pk')
+                     .values_list('pk', flat=True)[:200])
+        if not (groups and authors and posts):
+            raise CommandError('Нужны посты, авторы и группы; '
+                               'сначала seed_posts.')
+        return {
+            'index': ['/', '/?page=2'],
+            'group': [f'/group/{slug}/' for slug in groups],
+            'profile': [f'/profile/{name}/' for name in authors],
+            'detail': [f'/posts/{pk}/' for pk in posts],
+        }
+
+    def sessions(self, count):
+        """A logged-in session per worker, for writes and member reads."""
+        users = list(User.objects.order_by('pk')[:count])
+        keys = []
+        for user in users:
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = (
+                'django.contrib.auth.backends.ModelBackend'
+            )
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.save()
+            keys.append(session.session_key)
+        return keys + [None] * (count - len(keys))
+
+    def summarize(self, outcomes, elapsed, options):
+        latencies = defaultdict(list)
+        statuses = Counter()
+        locked = 0
+        for samples, worker_locked in outcomes:
+            locked += worker_locked
+            for kind, latency, status in samples:
+                latencies[kind].append(latency)
+                latencies['all'].append(latency)
+                statuses[str(status)] += 1
+        total = len(latencies['all'])
+        return {
+            'workers': options['workers'],
+            'mode': options['mode'],
+            'requests': total,
+            'seconds': round(elapsed, 2),
+            'throughput': round(total / elapsed, 1) if elapsed else 0,
+            'statuses': dict(statuses),
+            'lock_errors': locked,
+            'latency_ms': {
+                kind: {
+                    'count': len(values),
+                    'p50': round(percentile(values, 0.50), 2),
+                    'p95': round(percentile(values, 0.95), 2),
+                    'p99': round(percentile(values, 0.99), 2),
+                }
+                for kind, values in sorted(latencies.items())
+            },
+        }
+
+    def report(self, summary):
+        self.stdout.write(
+            f'{summary["requests"]} запросов за {summary["seconds"]} с, '
+            f'{summary["throughput"]} в секунду; ответы '
+            f'{summary["statuses"]}; блокировок SQLite '
+            f'{summary["lock_errors"]}'
+        )
+        for kind, latency in summary['latency_ms'].items():
+            self.stdout.write(
+                f'  {kind:<8} {latency["count"]:>6}  p50 {latency["p50"]:>8}'
+                f'  p95 {latency["p95"]:>8}  p99 {latency["p99"]:>8} мс'
+            )
@@ -0,0 +1,58 @@
+import json
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def log_files(path):
+    """The log and its rotated copies, oldest first."""
+    files = [path]
+    number = 1
+    while os.path.exists(f'{path}.{number}'):
+        files.append(f'{path}.{number}')
+        number += 1
+    return [name for name in reversed(files) if os.path.exists(name)]
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: самые затратные '
+            'запросы по суммарному времени.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=settings.SLOW_QUERY_LOG_FILE)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        files = log_files(options['file'])
+        if not files:
+            raise CommandError(f'Нет журнала {options["file"]}')
+        stats = defaultdict(lambda: {
+            'count': 0, 'total': 0.0, 'max': 0.0, 'views': set(),
+            'plan': None,
+        })
+        for name in files:
+            with open(name, encoding='utf-8') as stream:
+                for line in stream:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    entry = stats[record['fingerprint']]
+                    entry['sql'] = record['sql']
+                    entry['count'] += 1
+                    entry['total'] += record['duration_ms']
+                    entry['max'] = max(entry['max'], record['duration_ms'])
+                    entry['views'].add(record['view'])
+                    entry['plan'] = entry['plan'] or record.get('plan')
+        worst = sorted(stats.items(), key=lambda item: -item[1]['total'])
+        for key, entry in worst[:options['limit']]:
+            self.stdout.write(
+                f'{key}  {entry["count"]} раз, всего {entry["total"]:.1f} мс, '
+                f'макс. {entry["max"]:.1f} мс, '
+                f'{", ".join(sorted(entry["views"]))}'
+            )
+            self.stdout.write(f'    {entry["sql"]}')
+            for step in entry['plan'] or ():
+                self.stdout.write(f'    > {step}')
@@ -0,0 +1,286 @@
+"""Prometheus metrics shared by all worker processes.
+
+Every process keeps its samples in memory and, at most once per
+``METRICS_FLUSH_INTERVAL`` seconds, writes them atomically to its own
+``<pid>-<token>.json`` file in ``METRICS_DIR``; the token is new for every
+process, so a reused pid never overwrites another worker's file.
+``/metrics`` adds up the files of all processes. It first moves the
+samples of processes that have exited into ``archive.json``, so counters
+never go backwards when a worker is recycled and the directory does not
+grow with every worker that ever ran.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files import locks
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+ARCHIVE = 'archive.json'
+LOCK = 'archive.lock'
+
+METRICS = {}
+
+
+class Metric:
+    def __init__(self, name, help_text, labels, buckets=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        METRICS[name] = self
+
+    @property
+    def kind(self):
+        return 'counter' if self.buckets is None else 'histogram'
+
+
+REQUESTS = Metric(
+    'yatube_requests_total', 'Ответы по имени URL и статусу.',
+    ('url_name', 'status'),
+)
+LATENCY = Metric(
+    'yatube_request_duration_seconds', 'Время ответа по имени URL.',
+    ('url_name',), LATENCY_BUCKETS,
+)
+QUERIES = Metric(
+    'yatube_request_queries', 'Число SQL-запросов на ответ по имени URL.',
+    ('url_name',), QUERY_BUCKETS,
+)
+CACHE = Metric(
+    'yatube_cache_requests_total', 'Обращения к кешам по исходу.',
+    ('cache', 'result'),
+)
+
+
+class Store:
+    """Samples of this process: counter values and histogram buckets."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex
+        self.samples = defaultdict(float)
+        self.flushed = 0.0
+
+    def _check_fork(self):
+        # A forked worker must not report what its parent had counted.
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, metric, labels, value=1):
+        with self.lock:
+            self._check_fork()
+            self.samples[(metric.name, labels, None)] += value
+
+    def observe(self, metric, labels, value):
+        with self.lock:
+            self._check_fork()
+            for bound in metric.buckets:
+                if value <= bound:
+                    self.samples[(metric.name, labels, bound)] += 1
+            self.samples[(metric.name, labels, '+Inf')] += 1
+            self.samples[(metric.name, labels, 'sum')] += value
+
+    def path(self):
+        return os.path.join(settings.METRICS_DIR, self.name())
+
+    def name(self):
+        return f'{self.pid}-{self.token}.json'
+
+    def flush(self, force=False):
+        with self.lock:
+            self._check_fork()
+            now = time.monotonic()
+            interval = settings.METRICS_FLUSH_INTERVAL
+            if not force and now - self.flushed < interval:
+                return
+            self.flushed = now
+            rows = [[name, list(labels), bucket, value]
+                    for (name, labels, bucket), value
+                    in self.samples.items()]
+        _write(self.path(), rows)
+
+
+store = Store()
+
+
+@atexit.register
+def _flush_on_exit():
+    if store.samples:
+        store.flush(force=True)
+
+
+def _write(path, data):
+    """Replace ``path`` with ``data`` as JSON, atomically."""
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=settings.METRICS_DIR,
+                                         suffix='.tmp')
+    with os.fdopen(handle, 'w') as stream:
+        json.dump(data, stream)
+    os.replace(temporary, path)
+
+
+def _read(path, default):
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        return default
+
+
+def _exited(name):
+    """Whether the process that wrote the file ``name`` has exited."""
+    pid, _, _ = name[:-len('.json')].partition('-')
+    try:
+        pid = int(pid)
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return name != store.name()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def _add(totals, rows):
+    for metric, labels, bucket, value in rows:
+        totals[(metric, tuple(labels), bucket)] += value
+
+
+def inc(metric, *labels, value=1):
+    store.inc(metric, tuple(str(label) for label in labels), value)
+
+
+def observe(metric, *labels, value):
+    store.observe(metric, tuple(str(label) for label in labels), value)
+
+
+def collect():
+    """Samples of all processes, summed.
+
+    Files of exited processes are added to the archive first. The archive
+    lists the files already in it, so a file left behind by a crash
+    between writing the archive and removing the file is not added twice.
+    """
+    store.flush(force=True)
+    directory = settings.METRICS_DIR
+    with open(os.path.join(directory, LOCK), 'a') as lock:
+        locks.lock(lock, locks.LOCK_EX)
+        try:
+            archive = _read(os.path.join(directory, ARCHIVE),
+                            {'files': [], 'rows': []})
+            names = [name for name in os.listdir(directory)
+                     if name.endswith('.json') and name != ARCHIVE]
+            exited = [name for name in names
+                      if _exited(name) and name not in archive['files']]
+            totals = defaultdict(float)
+            _add(totals, archive['rows'])
+            if exited:
+                for name in exited:
+                    _add(totals, _read(os.path.join(directory, name), []))
+                archive = {
+                    'files': [name for name in archive['files']
+                              if name in names] + exited,
+                    'rows': [[metric, list(labels), bucket, value]
+                             for (metric, labels, bucket), value
+                             in totals.items()],
+                }
+                _write(os.path.join(directory, ARCHIVE), archive)
+            for name in names:
+                path = os.path.join(directory, name)
+                if name in archive['files']:
+                    os.remove(path)
+                else:
+                    _add(totals, _read(path, []))
+        finally:
+            locks.unlock(lock)
+    return totals
+
+
+def _labels(metric, values, **extra):
+    pairs = list(zip(metric.labels, values)) + list(extra.items())
+    quoted = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(quoted) + '}'
+
+
+def _number(value):
+    return repr(float(value))
+
+
+def exposition(totals):
+    """Render summed samples in the Prometheus text format."""
+    series = defaultdict(dict)
+    for (name, labels, bucket), value in totals.items():
+        series[name].setdefault(labels, {})[bucket] = value
+    lines = []
+    for name, metric in METRICS.items():
+        lines.append(f'# HELP {name} {metric.help_text}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, values in sorted(series[name].items()):
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(metric, labels)} '
+                             f'{_number(values[None])}')
+                continue
+            for bound in metric.buckets:
+                lines.append(
+                    f'{name}_bucket{_labels(metric, labels, le=bound)} '
+                    f'{_number(values.get(bound, 0))}'
+                )
+            count = values.get('+Inf', 0)
+            lines.append(f'{name}_bucket{_labels(metric, labels, le="+Inf")}'
+                         f' {_number(count)}')
+            lines.append(f'{name}_sum{_labels(metric, labels)} '
+                         f'{_number(values.get("sum", 0))}')
+            lines.append(f'{name}_count{_labels(metric, labels)} '
+                         f'{_number(count)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(exposition(collect()), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Count responses, latency and queries per URL name.
+
+    Goes right before ``ServerTimingMiddleware`` and reads its timer; the
+    samples reach the shared store on the next flush.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        timer = getattr(request, 'timer', None)
+        if timer is not None:
+            match = request.resolver_match
+            url_name = match.view_name if match else 'unresolved'
+            inc(REQUESTS, url_name, response.status_code)
+            observe(LATENCY, url_name, value=timer.total)
+            observe(QUERIES, url_name, value=timer.queries)
+            store.flush()
+        return response
@@ -0,0 +1,109 @@
+"""cProfile for live requests.
+
+A request is profiled when it wins the ``PROFILING_SAMPLE_RATE`` draw or
+carries ``X-Profile: <PROFILING_TOKEN>``. Only the view call runs under
+the profiler. The stats land in ``PROFILING_DIR`` as
+``<url name>-<timestamp>.prof``, and the oldest files beyond
+``PROFILING_KEEP`` are removed. Staff list and download them at
+``/admin/profiles/``.
+"""
+import cProfile
+import hmac
+import os
+import random
+import re
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
+HEADER = 'HTTP_X_PROFILE'
+
+_unsafe = re.compile(r'[^\w.-]+')
+
+
+def wants_profile(request):
+    token = settings.PROFILING_TOKEN
+    header = request.META.get(HEADER)
+    # compare_digest() only takes ASCII str, so any header must go as bytes.
+    if token and header and hmac.compare_digest(header.encode(),
+                                                token.encode()):
+        return True
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def profile_name(request):
+    match = request.resolver_match
+    url_name = _unsafe.sub('_', match.view_name) if match else 'unresolved'
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+    return f'{url_name}-{stamp}.prof'
+
+
+def profile_files():
+    """Stored profiles, newest first."""
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    paths = [os.path.join(settings.PROFILING_DIR, name)
+             for name in names if name.endswith('.prof')]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def prune():
+    for path in profile_files()[settings.PROFILING_KEEP:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMiddleware:
+    """Run sampled or requested views under cProfile."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not wants_profile(request):
+            return None
+        profiler = cProfile.Profile()
+        response = profiler.runcall(view_func, request, *view_args,
+                                    **view_kwargs)
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        name = profile_name(request)
+        profiler.dump_stats(os.path.join(settings.PROFILING_DIR, name))
+        prune()
+        response['X-Profile'] = name
+        return response
+
+
+@staff_member_required
+def profile_list(request):
+    profiles = [
+        {
+            'name': os.path.basename(path),
+            'size': os.path.getsize(path),
+            'created': datetime.fromtimestamp(os.path.getmtime(path)),
+        }
+        for path in profile_files()
+    ]
+    return render(request, 'core/profiles.html', {
+        'title': 'Профили запросов',
+        'profiles': profiles,
+    })
+
+
+@staff_member_required
+def profile_download(request, name):
+    for path in profile_files():
+        if os.path.basename(path) == name:
+            return FileResponse(open(path, 'rb'), as_attachment=True,
+                                filename=name)
+    raise Http404('Профиль не найден.')
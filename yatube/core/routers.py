@@ -0,0 +1,85 @@
+"""Read replicas for the feed and detail views.
+
+Views wrapped in ``read_from_replica`` read from a random alias of
+``DATABASE_REPLICAS``; everything else, all writes and the session table
+always use ``default``, and the user of the request is loaded from
+``default`` before the view starts. ``ReplicaPinMiddleware`` keeps a
+client on the primary for ``REPLICA_PIN_SECONDS`` after any request that
+wrote, so an author sees their post straight away even if the replicas
+lag behind.
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+PRIMARY_APPS = {'sessions', 'admin'}
+PIN_COOKIE = 'replica_pin'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned = ContextVar('replica_pinned', default=False)
+_wrote = ContextVar('replica_wrote', default=False)
+
+
+def choose_replica():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (not settings.DATABASE_REPLICAS or not _replica_reads.get()
+                or _pinned.get() or _wrote.get()
+                or model._meta.app_label in PRIMARY_APPS):
+            return PRIMARY
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are copies of the primary file, schema included.
+        return db not in settings.DATABASE_REPLICAS
+
+
+def read_from_replica(view):
+    """Send the read queries of ``view`` to a replica."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = getattr(request, 'user', None)
+        if user is not None:
+            # Authentication reads from the primary: evaluate the lazy user.
+            user.is_authenticated
+        token = _replica_reads.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """Read from the primary for a while after a client has written."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and settings.DATABASE_REPLICAS:
+                response.set_cookie(
+                    PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True, samesite='Lax',
+                )
+            return response
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
@@ -0,0 +1,12 @@
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    """Drop persistent connections that stopped answering.
+
+    Django's own ``close_old_connections`` only checks a connection after
+    a query on it has failed.
+    """
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
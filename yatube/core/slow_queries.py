@@ -0,0 +1,116 @@
+"""Log SQL statements slower than ``SLOW_QUERY_THRESHOLD_MS``.
+
+Every slow statement becomes a JSON line in the ``yatube.slow_queries``
+logger, which writes to a rotating file. The line carries a normalized
+form of the SQL, with literals and ``IN`` lists folded, and its
+fingerprint. The first time a process sees a fingerprint it also runs
+``EXPLAIN`` on the statement and logs the plan. The ``slow_queries``
+command aggregates the log by fingerprint.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, NotSupportedError, connections
+
+logger = logging.getLogger('yatube.slow_queries')
+
+_explained = set()
+
+NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(normalized):
+    return hashlib.md5(normalized.encode()).hexdigest()[:12]
+
+
+def is_select(sql):
+    return sql.lstrip()[:6].upper() == 'SELECT'
+
+
+def explain(connection, sql, params):
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [str(row[-1]) for row in cursor.fetchall()]
+    except (DatabaseError, NotSupportedError):
+        return None
+
+
+class SlowQueryLog:
+    """Execute wrapper that logs the slow statements of one request."""
+
+    def __init__(self, request, threshold_ms):
+        self.request = request
+        self.threshold = threshold_ms / 1000
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.log(sql, params, many, duration, context['connection'])
+
+    def view(self):
+        match = self.request.resolver_match
+        return match.view_name if match else self.request.path
+
+    def log(self, sql, params, many, duration, connection):
+        normalized = normalize(sql)
+        key = fingerprint(normalized)
+        record = {
+            'fingerprint': key,
+            'sql': normalized,
+            'params': len(params or ()),
+            'many': many,
+            'duration_ms': round(duration * 1000, 1),
+            'view': self.view(),
+            'database': connection.alias,
+        }
+        if key not in _explained and not many and is_select(sql):
+            _explained.add(key)
+            self.explaining = True
+            try:
+                record['plan'] = explain(connection, sql, params)
+            finally:
+                self.explaining = False
+        logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+class SlowQueryLogMiddleware:
+    """Log the slow queries of each request together with its view."""
+
+    def __init__(self, get_response):
+        if settings.SLOW_QUERY_THRESHOLD_MS is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        log = SlowQueryLog(request, settings.SLOW_QUERY_THRESHOLD_MS)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            return self.get_response(request)
@@ -0,0 +1,77 @@
+"""SQLite backend tuned for serving the site.
+
+On top of Django's sqlite3 backend it:
+
+* applies ``SQLITE_PRAGMAS`` to every new connection: WAL journal, busy
+  timeout, relaxed fsync, memory-mapped reads and a larger page cache,
+  then the ``PRAGMAS`` of the database's own ``DATABASES`` entry; with
+  ``foreign_keys`` turned off there, constraints stay unchecked;
+* retries statements that fail with "database is locked" outside a
+  transaction, up to ``SQLITE_LOCK_RETRIES`` times with exponential
+  backoff;
+* reports a connection as usable only if it answers ``SELECT 1``, so
+  persistent connections (``CONN_MAX_AGE``) are health-checked.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+
+def is_lock_error(error):
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_locked(execute, sql, params, many, context):
+    connection = context['connection']
+    delay = settings.SQLITE_LOCK_BACKOFF
+    for attempt in range(settings.SQLITE_LOCK_RETRIES + 1):
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as error:
+            # Inside a transaction the whole transaction has to be
+            # replayed, which only its caller can do.
+            if (not is_lock_error(error) or connection.in_atomic_block
+                    or attempt == settings.SQLITE_LOCK_RETRIES):
+                raise
+        time.sleep(delay * (1 + random.random()))
+        delay *= 2
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # First in the list, so it wraps every other execute wrapper.
+        self.execute_wrappers.append(retry_locked)
+
+    def pragmas(self):
+        return {**settings.SQLITE_PRAGMAS,
+                **self.settings_dict.get('PRAGMAS', {})}
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas().items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def checks_foreign_keys(self):
+        return str(self.pragmas().get('foreign_keys', 'ON')).upper() != 'OFF'
+
+    def enable_constraint_checking(self):
+        # Schema changes switch foreign keys back on when they finish.
+        if self.checks_foreign_keys():
+            super().enable_constraint_checking()
+
+    def check_constraints(self, table_names=None):
+        if self.checks_foreign_keys():
+            super().check_constraints(table_names)
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
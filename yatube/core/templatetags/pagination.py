@@ -0,0 +1,43 @@
+from django import template
+from django.http import QueryDict
+
+register = template.Library()
+
+ELLIPSIS = '…'
+
+
+@register.filter
+def elided_page_range(page_obj, on_each_side=3):
+    """First and last page plus a window around the current one.
+
+    Same shape as ``Paginator.get_elided_page_range`` from newer Django:
+    the pager stays a handful of links however many pages the feed has.
+    """
+    number = page_obj.number
+    num_pages = page_obj.paginator.num_pages
+    on_each_side = int(on_each_side)
+    if num_pages <= (on_each_side + 2) * 2:
+        return list(range(1, num_pages + 1))
+    pages = [1]
+    if number - on_each_side > 2:
+        pages.append(ELLIPSIS)
+    pages.extend(range(max(2, number - on_each_side),
+                       min(num_pages - 1, number + on_each_side) + 1))
+    if number + on_each_side < num_pages - 1:
+        pages.append(ELLIPSIS)
+    pages.append(num_pages)
+    return pages
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, **params):
+    """Current query string with the page or cursor swapped out."""
+    request = context.get('request')
+    query = request.GET.copy() if request is not None else QueryDict(
+        mutable=True
+    )
+    for key in ('page', 'cursor'):
+        query.pop(key, None)
+    for key, value in params.items():
+        query[key] = value
+    return f'?{query.urlencode()}'
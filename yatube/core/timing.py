@@ -0,0 +1,138 @@
+"""Per-request timings: database, templates, view and total.
+
+``ServerTimingMiddleware`` hangs a ``RequestTimer`` on the request, feeds
+it from a database execute wrapper and ``TimedDjangoTemplates``, then
+reports the totals in a ``Server-Timing`` header and a JSON log line.
+Each measurement is a pair of ``perf_counter()`` calls, cheap enough to
+keep on in production.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger('yatube.timing')
+
+
+@contextmanager
+def quiet():
+    """Drop the per-request log lines meanwhile, e.g. while benchmarking."""
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class RequestTimer:
+    """Durations, in seconds, collected while one request is served."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.view = 0.0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def stop(self):
+        finished = time.perf_counter()
+        if self.view_started is not None:
+            self.view = finished - self.view_started
+        self.total = finished - self.started
+
+    def header(self):
+        return ', '.join([
+            f'db;dur={_ms(self.db)};desc="{self.queries} queries"',
+            f'tpl;dur={_ms(self.template)}',
+            f'view;dur={_ms(self.view)}',
+            f'total;dur={_ms(self.total)}',
+        ])
+
+    def record(self, request, response):
+        match = request.resolver_match
+        return {
+            'url_name': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': self.queries,
+            'db_ms': _ms(self.db),
+            'template_ms': _ms(self.template),
+            'view_ms': _ms(self.view),
+            'total_ms': _ms(self.total),
+        }
+
+
+class ServerTimingMiddleware:
+    """Time each request; goes near the top of ``MIDDLEWARE``.
+
+    Only ``MetricsMiddleware`` runs before it, so the timings cover the rest
+    of the middleware and the view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = request.timer = RequestTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        timer.stop()
+        response['Server-Timing'] = timer.header()
+        logger.info(json.dumps(timer.record(request, response)))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timer.view_started = time.perf_counter()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timer = getattr(request, 'timer', None)
+        if timer is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer.template += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` that adds top-level render time to the timer.
+
+    Included templates render inside their parent, so they are not counted
+    twice. Queries run by lazy querysets in a template count as template
+    time as well as database time.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name),
+                                 self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
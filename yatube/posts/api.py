@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from core.routers import read_from_replica
+
+from . import sharding
+from .decorators import cache_anonymous_page, feed_condition
+from .feeds import feed_key
+from .models import AuthorStats, Group, Post, User
+from .paginators import CursorPaginator
+from .views import author_feed, group_feed, post_feed
+
+COLUMNS = (
+    'id', 'text', 'pub_date', 'author__username', 'author__first_name',
+    'author__last_name', 'group__slug',
+)
+
+
+def row_position(row):
+    return row[2], row[0]
+
+
+def post_row(post):
+    """``COLUMNS`` of a post whose author and group are loaded."""
+    author, group = post.author, post.group
+    return (
+        post.id, post.text, post.pub_date,
+        author and author.username, author and author.first_name,
+        author and author.last_name, group and group.slug,
+    )
+
+
+def serialize(row):
+    post_id, text, pub_date, username, first_name, last_name, group = row
+    return {
+        'id': post_id,
+        'text': text,
+        'pub_date': pub_date.isoformat(),
+        'author': {
+            'username': username,
+            'full_name': f'{first_name or ""} {last_name or ""}'.strip(),
+        },
+        'group': group,
+    }
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def feed_response(request, queryset):
+    """One cursor page of a feed, built from plain ``values_list`` tuples.
+
+    The shards cannot join users and groups, so there the page is read as
+    posts and their authors and groups are prefetched from ``default``.
+    """
+    cursor = request.GET.get('cursor')
+    if sharding.enabled():
+        page = CursorPaginator(queryset, settings.POST_COUNT).get_page(cursor)
+        prefetch_related_objects(page.object_list, 'author', 'group')
+        rows = [post_row(post) for post in page]
+    else:
+        paginator = CursorPaginator(queryset.values_list(*COLUMNS),
+                                    settings.POST_COUNT,
+                                    position=row_position)
+        page = rows = paginator.get_page(cursor)
+    return json_response({
+        'results': [serialize(row) for row in rows],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+@read_from_replica
+@feed_condition(lambda: feed_key())
+@cache_anonymous_page
+def index(request):
+    return feed_response(request, Post.objects.sharded())
+
+
+@read_from_replica
+@feed_condition(group_feed)
+@cache_anonymous_page
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request,
+                         Post.objects.filter(group=group).sharded())
+
+
+@read_from_replica
+@feed_condition(author_feed)
+@cache_anonymous_page
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(request, Post.objects.of_author(author.pk))
+
+
+@read_from_replica
+@feed_condition(post_feed)
+@cache_anonymous_page
+def post_detail(request, post_id):
+    if sharding.enabled():
+        post = (Post.objects.with_related('author__post_stats', 'group')
+                .of_post(post_id).first())
+        row = None
+        if post is not None:
+            row = (*post_row(post), AuthorStats.posts_count_of(post.author))
+    else:
+        row = Post.objects.filter(pk=post_id).values_list(
+            *COLUMNS, 'author__post_stats__posts_count'
+        ).first()
+    if row is None:
+        return json_response({'detail': 'Пост не найден.'}, status=404)
+    data = serialize(row[:-1])
+    data['author']['posts_count'] = row[-1] or 0
+    return json_response(data)
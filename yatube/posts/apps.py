@@ -3,3 +3,16 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .search import install_search_index
+        from .sharding import install_sequences
+        from .timelines import install_timelines
+        from .upgrade import upgrade_schema
+        post_migrate.connect(upgrade_schema, sender=self)
+        post_migrate.connect(install_search_index, sender=self)
+        post_migrate.connect(install_sequences, sender=self)
+        post_migrate.connect(install_timelines, sender=self)
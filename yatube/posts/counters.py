@@ -0,0 +1,86 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import sharding
+from .models import AuthorStats, Group, Post, User
+
+
+def adjust(author_id=None, group_id=None, delta=1):
+    """Shift the stored post counters of an author and/or a group.
+
+    Counters never go below zero: rows written behind the signals' back,
+    e.g. by ``bulk_create``, may be deleted before ``recount`` has seen them.
+    """
+    shifted = Greatest(F('posts_count') + delta, 0)
+    if author_id is not None:
+        updated = AuthorStats.objects.filter(author_id=author_id).update(
+            posts_count=shifted
+        )
+        if not updated and delta > 0:
+            _, created = AuthorStats.objects.get_or_create(
+                author_id=author_id, defaults={'posts_count': delta}
+            )
+            if not created:
+                AuthorStats.objects.filter(author_id=author_id).update(
+                    posts_count=shifted
+                )
+    if group_id is not None:
+        Group.objects.filter(pk=group_id).update(posts_count=shifted)
+
+
+def recount():
+    """Rebuild every stored counter from the posts table."""
+    if sharding.enabled():
+        _recount_shards()
+        return
+    group_counts = Post.objects.filter(group=OuterRef('pk')).order_by()
+    group_counts = group_counts.values('group').annotate(
+        total=Count('pk')
+    ).values('total')
+    author_counts = Post.objects.filter(author__isnull=False).order_by()
+    author_counts = author_counts.values_list('author').annotate(Count('pk'))
+    with transaction.atomic():
+        Group.objects.update(
+            posts_count=Coalesce(Subquery(group_counts), 0)
+        )
+        AuthorStats.objects.all().delete()
+        AuthorStats.objects.bulk_create(
+            AuthorStats(author_id=author_id, posts_count=total)
+            for author_id, total in author_counts.iterator()
+        )
+
+
+def _recount_shards():
+    """``recount()`` over the shards: counted on each, added up here."""
+    group_totals = Counter()
+    author_totals = Counter()
+    for alias in settings.POST_SHARDS:
+        posts = Post.objects.using(alias).order_by()
+        group_totals.update(dict(
+            posts.filter(group__isnull=False).values_list('group')
+            .annotate(Count('pk'))
+        ))
+        author_totals.update(dict(
+            posts.filter(author__isnull=False).values_list('author')
+            .annotate(Count('pk'))
+        ))
+    # Users deleted without their signals, by raw SQL for one, leave posts
+    # on the shards that name authors who are gone.
+    authors = set(User.objects.values_list('pk', flat=True))
+    with transaction.atomic():
+        Group.objects.update(posts_count=0)
+        Group.objects.bulk_update(
+            [Group(pk=group_id, posts_count=total)
+             for group_id, total in group_totals.items()],
+            ['posts_count'], batch_size=500,
+        )
+        AuthorStats.objects.all().delete()
+        AuthorStats.objects.bulk_create(
+            AuthorStats(author_id=author_id, posts_count=total)
+            for author_id, total in author_totals.items()
+            if author_id in authors
+        )
@@ -0,0 +1,132 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from core import metrics
+
+from . import feeds
+
+LOCK_TIMEOUT = 10
+# How long a request without any copy waits for the one rendering it.
+COLD_WAIT = 2
+COLD_POLL = 0.05
+
+
+def page_cache_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:page:{path}'
+
+
+def _is_cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+def _from_entry(entry, state):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    response['X-Page-Cache'] = state
+    metrics.inc(metrics.CACHE, 'page', state)
+    return response
+
+
+def _wait_for(key, generation):
+    """The entry another request is rendering, once it is stored."""
+    deadline = time.monotonic() + COLD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(COLD_POLL)
+        entry = cache.get(key)
+        if entry is not None and entry['generation'] == generation:
+            return entry
+    return None
+
+
+def cache_anonymous_page(view):
+    """Serve a whole cached page to anonymous GET requests.
+
+    Entries are keyed by path and query string and remember the generation
+    of the global feed they were rendered at. An entry from an older
+    generation, after any post write, or one older than
+    ``ANONYMOUS_PAGE_CACHE_TIMEOUT`` is stale: the first request to take
+    the lock rebuilds it, while everybody else keeps getting the stale copy
+    for up to ``ANONYMOUS_PAGE_CACHE_STALE`` more seconds. Without any copy
+    the others wait up to ``COLD_WAIT`` seconds for the page being rendered
+    before rendering it themselves.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+        key = page_cache_key(request)
+        lock_key = f'{key}:lock'
+        generation = feeds.get_generation(feeds.ALL)
+        entry = cache.get(key)
+        if (entry is not None and entry['generation'] == generation
+                and entry['fresh_until'] > time.time()):
+            return _from_entry(entry, 'hit')
+        locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+        if not locked:
+            if entry is not None:
+                return _from_entry(entry, 'stale')
+            entry = _wait_for(key, generation)
+            if entry is not None:
+                return _from_entry(entry, 'hit')
+        metrics.inc(metrics.CACHE, 'page', 'miss')
+        try:
+            response = view(request, *args, **kwargs)
+            if _is_cacheable(response):
+                timeout = settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+                cache.set(key, {
+                    'content': response.content,
+                    'status': response.status_code,
+                    'headers': list(response.items()),
+                    'generation': generation,
+                    'fresh_until': time.time() + timeout,
+                }, timeout + settings.ANONYMOUS_PAGE_CACHE_STALE)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return response
+    return wrapper
+
+
+def feed_condition(get_feed):
+    """Answer conditional GETs from the feed generation, without rendering.
+
+    ``get_feed`` maps the view arguments to the feed whose writes change the
+    page, or to None when there is nothing to validate against. The ETag
+    carries the feed generation and the user, since logged-in users see a
+    different page. Last-Modified is only sent to anonymous readers for the
+    same reason.
+    """
+    def request_feed(request, *args, **kwargs):
+        if not hasattr(request, '_condition_feed'):
+            request._condition_feed = get_feed(*args, **kwargs)
+        return request._condition_feed
+
+    def etag(request, *args, **kwargs):
+        feed = request_feed(request, *args, **kwargs)
+        if feed is None:
+            return None
+        generation = feeds.get_generation(feed)
+        return f'{feed}-{generation}-{request.user.pk or 0}'
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        feed = request_feed(request, *args, **kwargs)
+        if feed is None:
+            return None
+        return feeds.get_modified(feed)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,91 @@
+import csv
+import heapq
+import json
+from itertools import islice
+from operator import itemgetter
+
+from django.conf import settings
+
+from . import sharding
+from .models import Group, User
+
+FIELDS = ('id', 'text', 'pub_date', 'author', 'group')
+COLUMNS = ('id', 'text', 'pub_date', 'author__username', 'group__slug')
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def export_rows(queryset):
+    """Plain tuples straight from the cursor, ``CHUNK_SIZE`` rows at a time.
+
+    The keys match what ``import_posts`` reads, so an export can be fed
+    back in as is.
+    """
+    if sharding.enabled():
+        return _shard_rows(queryset)
+    return queryset.order_by('-pub_date', '-pk').values_list(
+        *COLUMNS
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _shard_rows(queryset):
+    """``export_rows()`` of every shard, merged newest first.
+
+    The shards cannot join users and groups, so their names are looked up
+    on ``default`` once per chunk.
+    """
+    streams = [
+        queryset.using(alias).order_by('-pub_date', '-pk').values_list(
+            'id', 'text', 'pub_date', 'author_id', 'group_id'
+        ).iterator(chunk_size=CHUNK_SIZE)
+        for alias in settings.POST_SHARDS
+    ]
+    merged = heapq.merge(*streams, key=itemgetter(2, 0), reverse=True)
+    while True:
+        chunk = list(islice(merged, CHUNK_SIZE))
+        if not chunk:
+            return
+        usernames = dict(User.objects.filter(
+            pk__in={row[3] for row in chunk}
+        ).values_list('pk', 'username'))
+        slugs = dict(Group.objects.filter(
+            pk__in={row[4] for row in chunk}
+        ).values_list('pk', 'slug'))
+        for post_id, text, pub_date, author_id, group_id in chunk:
+            yield (post_id, text, pub_date, usernames.get(author_id),
+                   slugs.get(group_id))
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        record['pub_date'] = record['pub_date'].isoformat()
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class _Line:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(FIELDS)
+    for post_id, text, pub_date, author, group in rows:
+        yield writer.writerow(
+            (post_id, text, pub_date.isoformat(), author or '', group or '')
+        )
+
+
+SERIALIZERS = {
+    'ndjson': ndjson_lines,
+    'csv': csv_lines,
+}
+
+
+def export_lines(queryset, fmt):
+    return SERIALIZERS[fmt](export_rows(queryset))
@@ -0,0 +1,107 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core import metrics
+
+ALL = 'all'
+
+
+def feed_key(group_id=None, author_id=None):
+    if group_id is not None:
+        return f'group:{group_id}'
+    if author_id is not None:
+        return f'author:{author_id}'
+    return ALL
+
+
+def post_feeds(author_id, group_id):
+    """Feeds a post with these author and group ids shows up in."""
+    feeds = [ALL]
+    if author_id is not None:
+        feeds.append(feed_key(author_id=author_id))
+    if group_id is not None:
+        feeds.append(feed_key(group_id=group_id))
+    return feeds
+
+
+def count_cache_key(feed):
+    return f'posts:count:{feed}'
+
+
+def get_count(feed, queryset):
+    key = count_cache_key(feed)
+    count = cache.get(key)
+    if count is not None:
+        metrics.inc(metrics.CACHE, 'count', 'hit')
+        return count
+    metrics.inc(metrics.CACHE, 'count', 'miss')
+    count = queryset.count()
+    cache.set(key, count, settings.POST_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def bump_count(feed, delta):
+    try:
+        cache.incr(count_cache_key(feed), delta)
+    except ValueError:
+        pass
+
+
+def generation_cache_key(feed):
+    return f'posts:generation:{feed}'
+
+
+def _fresh_generation():
+    # A restarted counter must not line up with fragments left over from
+    # before it was evicted, so it starts from the clock rather than 1.
+    return time.time_ns()
+
+
+def get_generation(feed):
+    key = generation_cache_key(feed)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _fresh_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(feed):
+    key = generation_cache_key(feed)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_generation(), None)
+    cache.set(modified_cache_key(feed), timezone.now(), None)
+
+
+def invalidate(feed):
+    """Forget the cached count and retire cached pages of a feed."""
+    cache.delete(count_cache_key(feed))
+    bump_generation(feed)
+
+
+def modified_cache_key(feed):
+    return f'posts:modified:{feed}'
+
+
+def get_modified(feed):
+    """When the feed last changed; an unknown time counts as now."""
+    key = modified_cache_key(feed)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, timezone.now(), None)
+        modified = cache.get(key)
+    return modified
+
+
+def fragment_cache(feed):
+    """Template context for the ``{% cache %}`` block around a feed loop."""
+    return {
+        'feed': feed,
+        'generation': get_generation(feed),
+        'timeout': settings.POST_FRAGMENT_CACHE_TIMEOUT,
+    }
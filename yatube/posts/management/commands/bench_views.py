@@ -0,0 +1,199 @@
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import timing
+from posts.models import AuthorStats, Group, Post
+from posts.paginators import encode_cursor
+
+User = get_user_model()
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pages(count):
+    last = max(1, -(-count // settings.POST_COUNT))
+    return [('first', 1), ('middle', (last + 1) // 2), ('last', last)]
+
+
+def cursors(queryset, count):
+    """First, middle and last cursor pages of a feed."""
+    ordered = queryset.order_by('-pub_date', '-pk')
+    cases = [('first', '')]
+    for label, offset in (('middle', count // 2),
+                          ('last', count - settings.POST_COUNT)):
+        post = ordered[max(offset, 0):max(offset, 0) + 1].first()
+        if post is not None:
+            cases.append((label, encode_cursor(post, 'next')))
+    return cases
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа view из posts.urls на первой, средней '
+            'и последней странице и пишет результаты в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', default='bench.json')
+        parser.add_argument('--compare', help='JSON прошлого запуска.')
+        parser.add_argument('--warm', action='store_true',
+                            help='Не сбрасывать кеш перед каждым замером.')
+
+    def handle(self, *args, **options):
+        group = Group.objects.order_by('-posts_count', 'pk').first()
+        stats = AuthorStats.objects.order_by('-posts_count', 'pk').first()
+        if group is None or stats is None:
+            raise CommandError('В базе нет постов; сначала seed_posts.')
+        author = stats.author
+        self.repeat = options['repeat']
+        self.warm = options['warm']
+        self.anonymous = Client(HTTP_HOST='localhost')
+        self.member = Client(HTTP_HOST='localhost')
+        self.member.force_login(author)
+        results = []
+        # One log line per request would be timed along with the views.
+        with timing.quiet():
+            for case in self.cases(group, author):
+                results.append(self.measure(*case))
+                self.report(results[-1])
+        data = {
+            'meta': {
+                'commit': commit(),
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'repeat': self.repeat,
+                'warm': self.warm,
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as stream:
+            json.dump(data, stream, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def cases(self, group, author):
+        """``(view, page, url, client)`` for every view of ``posts.urls``."""
+        feeds = [
+            ('posts:index', {}, Post.objects.all(), 'posts:api_index'),
+            ('posts:group_list', {'slug': group.slug},
+             Post.objects.filter(group=group), 'posts:api_group_list'),
+            ('posts:profile', {'username': author.username},
+             Post.objects.filter(author=author), 'posts:api_profile'),
+        ]
+        for view, kwargs, queryset, api_view in feeds:
+            url = reverse(view, kwargs=kwargs)
+            count = queryset.count()
+            for label, number in pages(count):
+                yield view, label, f'{url}?page={number}', self.anonymous
+            for label, cursor in cursors(queryset, count):
+                yield (view, f'cursor {label}', f'{url}?cursor={cursor}',
+                       self.anonymous)
+                yield (api_view, label,
+                       f'{reverse(api_view, kwargs=kwargs)}?cursor={cursor}',
+                       self.anonymous)
+        yield ('posts:group_export', 'all',
+               reverse('posts:group_export', kwargs={'slug': group.slug}),
+               self.anonymous)
+        yield ('posts:profile_export', 'all',
+               reverse('posts:profile_export',
+                       kwargs={'username': author.username}),
+               self.anonymous)
+        ordered = Post.objects.order_by('pk').values_list('pk', flat=True)
+        total = ordered.count()
+        for label, offset in (('first', 0), ('middle', total // 2),
+                              ('last', total - 1)):
+            post_id = ordered[offset]
+            yield ('posts:post_detail', label,
+                   reverse('posts:post_detail', args=[post_id]),
+                   self.anonymous)
+            yield ('posts:api_post_detail', label,
+                   reverse('posts:api_post_detail', args=[post_id]),
+                   self.anonymous)
+        own_post = author.posts.order_by('pk').values_list(
+            'pk', flat=True
+        ).first()
+        yield ('posts:post_edit', 'form',
+               reverse('posts:post_edit', args=[own_post]), self.member)
+        yield ('posts:post_create', 'form', reverse('posts:post_create'),
+               self.member)
+        word = Post.objects.order_by('pk').values_list(
+            'text', flat=True
+        ).first().split()[0]
+        search = reverse('posts:search')
+        for label, number in pages(Post.objects.search(word).count()):
+            yield ('posts:search', label, f'{search}?q={word}&page={number}',
+                   self.anonymous)
+
+    def measure(self, view, page, url, client):
+        timings = []
+        for _ in range(self.repeat):
+            if not self.warm:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'view': view,
+            'page': page,
+            'url': url,
+            'status': response.status_code,
+            'queries': len(captured),
+            'min_ms': round(min(timings), 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+        }
+
+    def report(self, result):
+        self.stdout.write(
+            f'{result["view"]:<24} {result["page"]:<14} '
+            f'{result["median_ms"]:>9.2f} мс  {result["queries"]:>3} запр.'
+            f'  {result["status"]}'
+        )
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as stream:
+            previous = {(row['view'], row['page']): row
+                        for row in json.load(stream)['results']}
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Сравнение с {path}'))
+        for result in results:
+            before = previous.get((result['view'], result['page']))
+            if before is None or not before['median_ms']:
+                continue
+            change = result['median_ms'] / before['median_ms'] - 1
+            line = (f'{result["view"]:<24} {result["page"]:<14} '
+                    f'{before["median_ms"]:>9.2f} -> '
+                    f'{result["median_ms"]:>9.2f} мс ({change:+.0%})')
+            if change > 0.2:
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timelines
+
+
+class Command(BaseCommand):
+    help = ('Сверяет таймлайны групп и авторов с постами: сколько строк '
+            'не хватает и сколько лишних.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        totals = timelines.check(options['database'], options['batch_size'])
+        for table, (missing, stale) in totals.items():
+            self.stdout.write(f'{table}: не хватает {missing}, '
+                              f'лишних {stale}')
+        if any(missing or stale for missing, stale in totals.values()):
+            raise CommandError('Таймлайны расходятся с постами; '
+                               'запустите rebuild_timelines.')
+        self.stdout.write(self.style.SUCCESS('Таймлайны согласованы.'))
@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import AuthorTimeline, Group, GroupTimeline, Post
+from posts.paginators import CursorPaginator, encode_cursor
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Печатает EXPLAIN QUERY PLAN и время запросов ленты '
+            'для index, group_list и profile.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Сначала заполнить пустую базу столькими постами '
+                 'через seed_posts.',
+        )
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            call_command('seed_posts', posts=options['seed'],
+                         users=options['users'], groups=options['groups'],
+                         batch_size=options['batch_size'],
+                         stdout=self.stdout)
+        feeds = [('index', Post.objects.all())]
+        group = Group.objects.order_by('pk').first()
+        if group is not None:
+            feeds.append(('group_list', Post.objects.filter(group=group)))
+            feeds.append(('group_list timeline',
+                          GroupTimeline.objects.filter(group=group).posts()))
+        author = User.objects.filter(posts__isnull=False).first()
+        if author is not None:
+            feeds.append(('profile', Post.objects.filter(author=author)))
+            feeds.append((
+                'profile timeline',
+                AuthorTimeline.objects.filter(author=author).posts(),
+            ))
+        for name, queryset in feeds:
+            self.explain_feed(name, queryset)
+
+    def explain_feed(self, name, queryset):
+        per_page = settings.POST_COUNT
+        count = queryset.count()
+        last = max(1, -(-count // per_page))
+        middle = queryset.order_by('-pub_date', '-pk')[
+            count // 2:count // 2 + 1
+        ].first()
+        cases = [
+            ('?page=1',
+             lambda: list(Paginator(queryset, per_page).get_page(1))),
+            (f'?page={last}',
+             lambda: list(Paginator(queryset, per_page).get_page(last))),
+        ]
+        if middle is not None:
+            cursor = encode_cursor(middle, 'next')
+            cases.append((
+                '?cursor=<middle>',
+                lambda: list(CursorPaginator(queryset, per_page).page(cursor)),
+            ))
+        for label, run in cases:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name} {label}: {len(captured)} запр., {elapsed:.2f} мс'
+            ))
+            for query in captured:
+                self.stdout.write(f'  {query["sql"]}')
+                for line in self.query_plan(query['sql']):
+                    self.stdout.write(f'    {line}')
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exports import SERIALIZERS, export_lines
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты автора или группы в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--author', help='username автора')
+        source.add_argument('--group', help='slug группы')
+        parser.add_argument('--format', choices=SERIALIZERS,
+                            default='ndjson')
+        parser.add_argument('--output', default='-',
+                            help='Файл или "-" для stdout.')
+
+    def handle(self, *args, **options):
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'Нет автора {options["author"]}')
+            queryset = Post.objects.filter(author=author)
+        else:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(f'Нет группы {options["group"]}')
+            queryset = Post.objects.filter(group=group)
+        lines = export_lines(queryset, options['format'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as stream:
+            stream.writelines(lines)
@@ -0,0 +1,217 @@
+import csv
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import counters, feeds
+from posts.models import Group, Post
+from posts.utils import keep_pub_date
+
+User = get_user_model()
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield ValueError(f'неверный JSON: {error}')
+            continue
+        if not isinstance(record, dict):
+            yield ValueError('запись должна быть JSON-объектом')
+            continue
+        yield record
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+READERS = {
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+
+class Importer:
+    """Buffers records and writes them in chunks of ``batch_size`` posts.
+
+    Authors and groups are resolved through in-memory ``username -> id``
+    and ``slug -> id`` tables; names that are not there yet are created in
+    bulk right before the posts that need them.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.user_ids = dict(User.objects.values_list('username', 'pk'))
+        self.group_ids = dict(Group.objects.values_list('slug', 'pk'))
+        self.users = {}
+        self.groups = {}
+        self.posts = []
+        self.touched = set()
+        self.imported = 0
+
+    def add(self, record):
+        kind = record.get('type', 'post')
+        if kind == 'post':
+            if not record.get('text'):
+                raise ValueError('у поста нет текста')
+            pub_date = parse_pub_date(record.get('pub_date'))
+            self.posts.append(dict(record, pub_date=pub_date))
+            pending = len(self.posts)
+        elif kind == 'user':
+            if record['username'] not in self.user_ids:
+                self.users[record['username']] = record
+            pending = len(self.users) + len(self.groups)
+        elif kind == 'group':
+            if record['slug'] not in self.group_ids:
+                self.groups[record['slug']] = record
+            pending = len(self.users) + len(self.groups)
+        else:
+            raise ValueError(f'неизвестный тип записи {kind!r}')
+        if pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with transaction.atomic():
+            self._create_users()
+            self._create_groups()
+            self._create_posts()
+
+    def _create_users(self):
+        for post in self.posts:
+            author = post.get('author')
+            if author and author not in self.user_ids:
+                self.users.setdefault(author, {'username': author})
+        if not self.users:
+            return
+        User.objects.bulk_create(
+            User(
+                username=record['username'],
+                first_name=record.get('first_name', ''),
+                last_name=record.get('last_name', ''),
+                email=record.get('email', ''),
+            )
+            for record in self.users.values()
+        )
+        self.user_ids.update(User.objects.filter(
+            username__in=list(self.users)
+        ).values_list('username', 'pk'))
+        self.users = {}
+
+    def _create_groups(self):
+        for post in self.posts:
+            slug = post.get('group')
+            if slug and slug not in self.group_ids:
+                self.groups.setdefault(slug, {'slug': slug})
+        if not self.groups:
+            return
+        Group.objects.bulk_create(
+            Group(
+                slug=record['slug'],
+                title=record.get('title', record['slug']),
+                description=record.get('description', ''),
+            )
+            for record in self.groups.values()
+        )
+        self.group_ids.update(Group.objects.filter(
+            slug__in=list(self.groups)
+        ).values_list('slug', 'pk'))
+        self.groups = {}
+
+    def _create_posts(self):
+        if not self.posts:
+            return
+        now = timezone.now()
+        rows = []
+        for record in self.posts:
+            author_id = self.user_ids.get(record.get('author'))
+            group_id = self.group_ids.get(record.get('group'))
+            rows.append(Post(
+                text=record['text'],
+                author_id=author_id,
+                group_id=group_id,
+                pub_date=record['pub_date'] or now,
+            ))
+            self.touched.update(feeds.post_feeds(author_id, group_id))
+        with keep_pub_date():
+            Post.objects.bulk_create(rows)
+        self.imported += len(rows)
+        self.posts = []
+
+
+def parse_pub_date(value):
+    if not value:
+        return None
+    pub_date = parse_datetime(value)
+    if pub_date is None:
+        raise ValueError(f'не удалось разобрать дату {value!r}')
+    if timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    return pub_date
+
+
+class Command(BaseCommand):
+    help = ('Потоково импортирует пользователей, группы и посты '
+            'из JSONL или CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или "-" для stdin.')
+        parser.add_argument('--format', choices=READERS, default=None,
+                            help='По умолчанию — по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv')
+                                    else 'jsonl')
+        if path == '-':
+            self.run(READERS[fmt](sys.stdin), options['batch_size'])
+            return
+        try:
+            with open(path, encoding='utf-8', newline='') as stream:
+                self.run(READERS[fmt](stream), options['batch_size'])
+        except OSError as error:
+            raise CommandError(error)
+
+    def run(self, records, batch_size):
+        importer = Importer(batch_size)
+        started = time.perf_counter()
+        reported = 0
+        skipped = 0
+        for number, record in enumerate(records, start=1):
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                importer.add(record)
+            except (KeyError, ValueError) as error:
+                skipped += 1
+                self.stderr.write(f'Запись {number} пропущена: {error}')
+            if importer.imported > reported:
+                reported = importer.imported
+                self.report(reported, started)
+        importer.flush()
+        if importer.imported > reported:
+            self.report(importer.imported, started)
+        counters.recount()
+        for feed in importer.touched:
+            feeds.invalidate(feed)
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано постов: {importer.imported}, '
+            f'пропущено записей: {skipped}'
+        ))
+
+    def report(self, imported, started):
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(f'{imported} постов, {rate:.0f} в секунду')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Создаёт и заново заполняет полнотекстовый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not search.install(options['database']):
+            raise CommandError(
+                'Полнотекстовый поиск работает только на SQLite.'
+            )
+        search.rebuild(options['database'])
+        self.stdout.write('Индекс поиска перестроен.')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timelines
+
+
+class Command(BaseCommand):
+    help = ('Создаёт триггеры таймлайнов групп и авторов и приводит '
+            'таймлайны в соответствие с постами, пачками по id.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if not timelines.install(options['database']):
+            raise CommandError('Таймлайны работают только на SQLite '
+                               'и не хранятся в шардах.')
+        written = deleted = 0
+        for last_id, found in timelines.scan(
+            options['database'], options['batch_size'], fix=True
+        ):
+            written += sum(missing for missing, _ in found.values())
+            deleted += sum(stale for _, stale in found.values())
+            self.stdout.write(f'До id {last_id}: записано {written}, '
+                              f'удалено {deleted}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Таймлайны перестроены: записано {written}, удалено {deleted}'
+        ))
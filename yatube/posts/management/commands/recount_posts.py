@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+from posts.models import AuthorStats, Group
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые счётчики постов авторов и групп.'
+
+    def handle(self, *args, **options):
+        counters.recount()
+        self.stdout.write(
+            f'Пересчитано: групп {Group.objects.count()}, '
+            f'авторов {AuthorStats.objects.count()}'
+        )
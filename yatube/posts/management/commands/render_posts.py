@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет сохранённый HTML и анонс постов, '
+            'у которых их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Перерисовать все посты, а не только пустые.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rendered = 0
+        for alias in settings.POST_SHARDS or [DEFAULT_DB_ALIAS]:
+            posts = Post.objects.using(alias)
+            if not options['all']:
+                posts = posts.filter(text_html='')
+            rendered += posts.render_stored(options['batch_size'])
+        self.stdout.write(f'Обработано постов: {rendered}')
@@ -0,0 +1,105 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import counters, feeds
+from posts.models import Group, Post
+from posts.utils import keep_pub_date
+
+User = get_user_model()
+
+# Posts are dated from a fixed moment, not from now, so that two seeded
+# databases are identical row for row.
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+WORDS = (
+    'утро вечер город река дорога окно книга письмо друг сад дом лес '
+    'поезд море небо ветер снег дождь солнце музыка кофе чай работа '
+    'отпуск идея проект код тест сервер база запрос ответ страница лента '
+    'группа автор пост новость история встреча прогулка фото кадр'
+).split()
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу детерминированными тестовыми данными '
+            'для бенчмарков: пользователи, группы и посты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith='seed_user_').exists():
+            raise CommandError('База уже заполнена seed_posts; '
+                               'возьмите пустую базу.')
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        User.objects.bulk_create(
+            User(username=f'seed_user_{i}', password=UNUSABLE_PASSWORD_PREFIX)
+            for i in range(options['users'])
+        )
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'seed-{i}',
+                  description=self.text(rng, 10, 30))
+            for i in range(options['groups'])
+        )
+        author_ids = list(User.objects.filter(
+            username__startswith='seed_user_'
+        ).order_by('pk').values_list('pk', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith='seed-'
+        ).order_by('pk').values_list('pk', flat=True))
+        self.seed_posts(rng, options['posts'], author_ids, group_ids,
+                        batch_size, started)
+        counters.recount()
+        feeds.invalidate(feeds.ALL)
+        for author_id in author_ids:
+            feeds.invalidate(feeds.feed_key(author_id=author_id))
+        for group_id in group_ids:
+            feeds.invalidate(feeds.feed_key(group_id=group_id))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(author_ids)}, групп '
+            f'{len(group_ids)}, постов {options["posts"]} за '
+            f'{time.perf_counter() - started:.0f} с'
+        ))
+
+    def seed_posts(self, rng, count, author_ids, group_ids, batch_size,
+                   started):
+        # Activity is skewed like on a real site: a few authors and groups
+        # get most of the posts, and a third of the posts have no group.
+        author_weights = [1 / (rank + 1) for rank in range(len(author_ids))]
+        group_weights = [1 / (rank + 1) for rank in range(len(group_ids))]
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            authors = rng.choices(author_ids, author_weights, k=size)
+            groups = rng.choices(group_ids, group_weights, k=size)
+            posts = [
+                Post(
+                    text=self.text(rng, 5, 80),
+                    author_id=author_id,
+                    group_id=group_id if rng.random() > 1 / 3 else None,
+                    pub_date=EPOCH + timedelta(seconds=(offset + i) * 60),
+                )
+                for i, (author_id, group_id)
+                in enumerate(zip(authors, groups))
+            ]
+            with transaction.atomic(), keep_pub_date():
+                Post.objects.bulk_create(posts)
+            done = offset + size
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{done} постов, {done / elapsed:.0f} в секунду')
+
+    @staticmethod
+    def text(rng, shortest, longest):
+        words = rng.choices(WORDS, k=rng.randint(shortest, longest))
+        lines = [' '.join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        return '\n'.join(lines).capitalize()
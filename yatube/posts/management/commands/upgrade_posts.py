@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import upgrade
+
+
+class Command(BaseCommand):
+    help = ('Добавляет в существующую базу столбцы и индексы, которых '
+            'migrate --run-syncdb не создаёт в готовых таблицах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        added = upgrade.upgrade(options['database'])
+        for name in added:
+            self.stdout.write(f'Добавлено: {name}')
+        self.stdout.write(self.style.SUCCESS(
+            'Схема в порядке.' if not added
+            else f'Схема обновлена, изменений: {len(added)}'
+        ))
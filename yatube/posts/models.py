@@ -1,22 +1,160 @@
-from django.db import models
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.query import BaseIterable
 from django.contrib.auth import get_user_model
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+from . import search, sharding
 
 User = get_user_model()
 
+EXCERPT_WORDS = 30
+
+RENDERED_FIELDS = ('text_html', 'excerpt')
+
+
+def render_text(text):
+    """The stored ``(text_html, excerpt)`` pair for a post text."""
+    return (
+        linebreaksbr(text, autoescape=True),
+        Truncator(text).words(EXCERPT_WORDS, truncate=' …'),
+    )
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Posts for list pages: author and group joined, no unused columns."""
+        fields = ['id', 'text_html', 'excerpt', 'pub_date', 'author_id',
+                  'group_id']
+        if sharding.enabled():
+            return self.with_related('author', 'group').only(*fields)
+        return self.with_related('author', 'group').only(
+            *fields,
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__slug', 'group__title',
+        )
+
+    def with_related(self, *fields):
+        """``select_related``, or ``prefetch_related`` across shards."""
+        if sharding.enabled():
+            return self.prefetch_related(*fields)
+        return self.select_related(*fields)
+
+    def sharded(self):
+        """This query over all shards, merged; itself without sharding."""
+        if not sharding.enabled():
+            return self
+        return sharding.MergedQuerySet([
+            self.using(alias) for alias in settings.POST_SHARDS
+        ])
+
+    def of_author(self, author_id):
+        queryset = self.filter(author_id=author_id)
+        if sharding.enabled():
+            return queryset.using(sharding.author_shard(author_id))
+        return queryset
+
+    def of_post(self, post_id):
+        queryset = self.filter(pk=post_id)
+        if sharding.enabled():
+            return queryset.using(sharding.post_shard(post_id))
+        return queryset
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.render()
+        if not sharding.enabled():
+            return super().bulk_create(objs, *args, **kwargs)
+        by_shard = {}
+        for obj in objs:
+            alias = sharding.author_shard(obj.author_id)
+            by_shard.setdefault(alias, []).append(obj)
+        for alias, shard_objs in by_shard.items():
+            ids = sharding.allocate_ids(alias, len(shard_objs))
+            for obj, pk in zip(shard_objs, ids):
+                obj.pk = pk
+            super(PostQuerySet, self.using(alias)).bulk_create(
+                shard_objs, *args, **kwargs
+            )
+        return objs
+
+    def render_stored(self, batch_size=2000):
+        """Store the rendered text of these posts, in batches by id."""
+        posts = self.order_by('pk')
+        rendered = 0
+        last_pk = 0
+        while True:
+            rows = list(posts.filter(pk__gt=last_pk).values_list(
+                'pk', 'text'
+            )[:batch_size])
+            if not rows:
+                return rendered
+            batch = []
+            for pk, text in rows:
+                post = Post(pk=pk)
+                post.text_html, post.excerpt = render_text(text)
+                batch.append(post)
+            with transaction.atomic(self.db):
+                self.model.objects.using(self.db).bulk_update(
+                    batch, RENDERED_FIELDS
+                )
+            rendered += len(batch)
+            last_pk = rows[-1][0]
+
+    def update(self, **kwargs):
+        if isinstance(kwargs.get('text'), str):
+            kwargs.update(zip(RENDERED_FIELDS, render_text(kwargs['text'])))
+        return super().update(**kwargs)
+
+    def search(self, query, ranked=True):
+        """Posts whose text matches every word of ``query``.
+
+        With ``ranked`` the result is joined to the FTS5 table and ordered
+        by bm25 relevance; otherwise it is a plain ``id IN (...)`` filter
+        that keeps the caller's ordering.
+        """
+        match = search.match_expression(query)
+        if not match:
+            return self.none()
+        if not ranked:
+            # Not pk__in=RawSQL(...): Django wraps it in a second pair of
+            # parentheses and SQLite then reads it as a scalar subquery that
+            # yields only the first rowid.
+            return self.extra(
+                where=[f'posts_post.id IN (SELECT rowid FROM {search.TABLE} '
+                       f'WHERE {search.TABLE} MATCH %s)'],
+                params=[match],
+            )
+        return self.extra(
+            tables=[search.TABLE],
+            where=[f'{search.TABLE}.rowid = posts_post.id',
+                   f'{search.TABLE} MATCH %s'],
+            params=[match],
+            select={'rank': f'{search.TABLE}.rank'},
+            order_by=['rank'],
+        )
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name="Текст сообщения",
                             help_text="Обязательное поле,\
                              не должно быть пустым")
+    text_html = models.TextField(editable=False, default='')
+    excerpt = models.TextField(editable=False, default='')
     pub_date = models.DateTimeField("date published", auto_now_add=True)
     author = models.ForeignKey(
         User,
@@ -35,9 +173,164 @@ class Post(models.Model):
         help_text="Выберите название группы"
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
         default_related_name = 'posts'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text
+
+    def render(self):
+        """Store the HTML body and the excerpt templates show for the text."""
+        self.text_html, self.excerpt = render_text(self.text)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.render()
+        elif 'text' in update_fields:
+            self.render()
+            kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+        if self.pk is None and sharding.enabled():
+            # QuerySet.create() passes the default alias along; a new post
+            # goes to its author's shard whatever it was given.
+            alias = sharding.author_shard(self.author_id)
+            self.pk = sharding.allocate_ids(alias, 1)[0]
+            kwargs.update(using=alias, force_insert=True)
+        elif (sharding.enabled() and self._state.db in settings.POST_SHARDS
+                and sharding.author_shard(self.author_id) != self._state.db):
+            self._move_shard(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
+    def _move_shard(self, *args, **kwargs):
+        """Save a post whose new author lives on another shard.
+
+        The post is inserted there under a new id, since ids name their
+        shard, and the old row is deleted; the post signals of the two
+        writes move the counters and retire the cached feeds. Writes to two
+        database files cannot share a transaction, so the insert goes first:
+        a failure in between leaves a copy rather than losing the post.
+        """
+        deferred = self.get_deferred_fields()
+        if deferred:
+            self.refresh_from_db(fields=deferred)
+        self.render()
+        old_alias, old_pk, pub_date = self._state.db, self.pk, self.pub_date
+        alias = sharding.author_shard(self.author_id)
+        self.pk = sharding.allocate_ids(alias, 1)[0]
+        kwargs.pop('update_fields', None)
+        kwargs.update(using=alias, force_insert=True)
+        super().save(*args, **kwargs)
+        # An insert stamps pub_date anew; the post keeps its date.
+        Post.objects.using(alias).filter(pk=self.pk).update(pub_date=pub_date)
+        self.pub_date = pub_date
+        Post.objects.using(old_alias).filter(pk=old_pk).delete()
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='post_stats',
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def posts_count_of(cls, author):
+        """Stored count; select_related('post_stats') saves the query."""
+        if author is None:
+            return 0
+        try:
+            return author.post_stats.posts_count
+        except cls.DoesNotExist:
+            return 0
+
+
+class TimelinePostIterable(BaseIterable):
+    """Feed posts of the entries, in the entries' order.
+
+    The entries only pick the ids, in a subquery that reads nothing but
+    the timeline index, even past an ``OFFSET``; the posts of the page are
+    then looked up by primary key.
+    """
+
+    def __iter__(self):
+        entries = self.queryset
+        posts = list(Post.objects.using(entries.db).for_feed().filter(
+            pk__in=entries.values('pk')
+        ).order_by())
+        # Entries are keyed and dated like their posts, so the page is put
+        # in order here rather than sorted again by SQLite.
+        ordering = entries.query.order_by or entries.model._meta.ordering
+        posts.sort(key=attrgetter(*(name.lstrip('-') for name in ordering)),
+                   reverse=ordering[0].startswith('-'))
+        yield from posts
+
+
+class TimelineQuerySet(models.QuerySet):
+    def posts(self):
+        """Iterate over the feed posts of these entries, not the entries.
+
+        Filters, ordering and slices still apply to the entries.
+        """
+        queryset = self._chain()
+        queryset._iterable_class = TimelinePostIterable
+        return queryset
+
+
+class GroupTimeline(models.Model):
+    """A post's place in its group feed; kept by triggers on posts_post."""
+    # A plain column rather than a relation: ordering by a relation would
+    # join posts_post for its Meta.ordering.
+    post_id = models.IntegerField(primary_key=True)
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-pub_date', '-pk']
+        indexes = [
+            models.Index(fields=['group', '-pub_date', '-post_id'],
+                         name='group_timeline_idx'),
+        ]
+
+
+class AuthorTimeline(models.Model):
+    """A post's place in its author feed; kept by triggers on posts_post."""
+    post_id = models.IntegerField(primary_key=True)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-pub_date', '-pk']
+        indexes = [
+            models.Index(fields=['author', '-pub_date', '-post_id'],
+                         name='author_timeline_idx'),
+        ]
@@ -0,0 +1,179 @@
+import base64
+import collections.abc
+
+from django.core.paginator import Paginator
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import feeds
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_position(pub_date, pk, direction):
+    raw = f'{direction}|{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def encode_cursor(post, direction):
+    return encode_position(post.pub_date, post.pk, direction)
+
+
+def post_position(post):
+    return post.pub_date, post.pk
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor(token)
+    if direction not in ('next', 'prev') or pub_date is None:
+        raise InvalidCursor(token)
+    return direction, pub_date, pk
+
+
+class CachedCountPaginator(Paginator):
+    """``Paginator`` whose total comes from a per-feed cached counter.
+
+    The counter lives for ``POST_COUNT_CACHE_TIMEOUT`` seconds and is bumped
+    by the ``Post`` save/delete signals in between, so ``COUNT(*)`` runs
+    once per feed per timeout instead of on every request.
+    """
+
+    def __init__(self, object_list, per_page, feed, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.feed = feed
+
+    @cached_property
+    def count(self):
+        return feeds.get_count(self.feed, self.object_list)
+
+
+class EstimatedCountPaginator(CachedCountPaginator):
+    """Estimates the global feed size as the largest post id.
+
+    That is a single rowid lookup; deleted posts only make the estimate
+    high, which shows up as empty trailing pages. Filtered feeds fall back
+    to the cached counter.
+    """
+
+    @cached_property
+    def count(self):
+        if self.feed != feeds.ALL:
+            return super().count
+        return self.object_list.aggregate(estimate=Max('pk'))['estimate'] or 0
+
+
+class CursorPage(collections.abc.Sequence):
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page of %d items>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        position = self.paginator.position(self.object_list[-1])
+        return encode_position(*position, 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        position = self.paginator.position(self.object_list[0])
+        return encode_position(*position, 'prev')
+
+
+class CursorPaginator:
+    """Keyset pagination over ``(pub_date, id)``, newest first.
+
+    Unlike ``Paginator`` it never runs ``COUNT(*)`` or ``OFFSET``: each page
+    is a range scan that starts right after the row encoded in the cursor,
+    so the cost of a page does not depend on how deep it is. The outer
+    ``pub_date`` bound is what lets SQLite seek the index instead of
+    scanning it for the ``OR``. ``position`` reads ``(pub_date, pk)`` off a
+    row, for querysets that do not yield ``Post`` instances.
+    """
+
+    def __init__(self, object_list, per_page, feed=None,
+                 position=post_position):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.feed = feed
+        self.position = position
+
+    @cached_property
+    def count(self):
+        if self.feed is None:
+            return self.object_list.count()
+        return feeds.get_count(self.feed, self.object_list)
+
+    def page(self, cursor=None):
+        if not cursor:
+            return self._forward(self.object_list, has_previous=False)
+        direction, pub_date, pk = decode_cursor(cursor)
+        if direction == 'next':
+            queryset = self.object_list.filter(pub_date__lte=pub_date).filter(
+                Q(pub_date__lt=pub_date) | Q(pk__lt=pk)
+            )
+            return self._forward(queryset, has_previous=True)
+        queryset = self.object_list.filter(pub_date__gte=pub_date).filter(
+            Q(pub_date__gt=pub_date) | Q(pk__gt=pk)
+        )
+        return self._backward(queryset)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def _forward(self, queryset, has_previous):
+        rows = list(
+            queryset.order_by('-pub_date', '-pk')[:self.per_page + 1]
+        )
+        return CursorPage(
+            rows[:self.per_page], self,
+            has_next=len(rows) > self.per_page,
+            has_previous=has_previous,
+        )
+
+    def _backward(self, queryset):
+        rows = list(
+            queryset.order_by('pub_date', 'pk')[:self.per_page + 1]
+        )
+        return CursorPage(
+            rows[:self.per_page][::-1], self,
+            has_next=bool(rows),
+            has_previous=len(rows) > self.per_page,
+        )
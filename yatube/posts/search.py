@@ -0,0 +1,64 @@
+"""FTS5 index over ``Post.text``.
+
+The index is an external-content FTS5 table: it stores only the token
+index and reads the text back from ``posts_post`` by rowid. Triggers keep
+it in sync, so ``save()``, ``bulk_create()`` and ``QuerySet.update()`` are
+all covered.
+"""
+from django.db import connections
+
+TABLE = 'posts_post_fts'
+
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_au
+    AFTER UPDATE OF text ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+
+def install(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        created = TABLE not in connection.introspection.table_names(cursor)
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    if created:
+        rebuild(using)
+    return True
+
+
+def rebuild(using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """Turn user input into an FTS5 query: every word must occur.
+
+    Each word is quoted, so FTS5 operators and stray quotes in the input
+    are searched for literally instead of breaking the query.
+    """
+    words = query.split()
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+def install_search_index(sender, using='default', **kwargs):
+    install(using)
@@ -0,0 +1,151 @@
+"""Posts spread over several databases by author.
+
+With ``POST_SHARDS`` set, every post lives in the shard picked by a hash
+of its author id, so one author's posts, and their writes, stay on one
+database file. Post ids are allocated per shard so that ``id % N`` is the
+shard index, which lets ``post_detail`` find a post by id alone; a post
+whose new author lives on another shard moves there under a new id.
+Feeds that span authors query every shard and merge the results.
+
+Only ``Post`` lives on the shards; users, groups and counters stay on
+``default``, and relations to them are loaded from there with
+``prefetch_related`` since SQL cannot join across database files.
+"""
+import heapq
+import zlib
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import prefetch_related_objects
+
+SEQUENCE_TABLE = 'posts_post_sequence'
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def author_shard(author_id):
+    shards = settings.POST_SHARDS
+    return shards[zlib.crc32(str(author_id).encode()) % len(shards)]
+
+
+def post_shard(post_id):
+    shards = settings.POST_SHARDS
+    return shards[int(post_id) % len(shards)]
+
+
+def allocate_ids(alias, count):
+    """``count`` new post ids on shard ``alias``, all congruent to it."""
+    shards = settings.POST_SHARDS
+    index = shards.index(alias)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {SEQUENCE_TABLE} SET next_id = next_id + %s '
+            f'RETURNING next_id', [count]
+        )
+        end = cursor.fetchone()[0]
+    return [local * len(shards) + index for local in range(end - count, end)]
+
+
+def install(using):
+    """Create the id sequence of a shard, past any ids already there."""
+    if using not in settings.POST_SHARD_DATABASES:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {SEQUENCE_TABLE} '
+                       f'(next_id INTEGER NOT NULL)')
+        cursor.execute(f'SELECT COUNT(*) FROM {SEQUENCE_TABLE}')
+        if cursor.fetchone()[0]:
+            return
+        cursor.execute('SELECT MAX(id) FROM posts_post')
+        last = cursor.fetchone()[0] or 0
+        cursor.execute(f'INSERT INTO {SEQUENCE_TABLE} (next_id) VALUES (%s)',
+                       [last // len(settings.POST_SHARD_DATABASES) + 1])
+
+
+def install_sequences(sender, using='default', **kwargs):
+    install(using)
+
+
+class ShardRouter:
+    """Sends ``Post`` to its shard; leaves every other model alone."""
+
+    def _post_db(self, model, hints):
+        if not enabled() or model._meta.label != 'posts.Post':
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._state.db:
+            return instance._state.db
+        return author_shard(instance.author_id)
+
+    def db_for_read(self, model, **hints):
+        return self._post_db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._post_db(model, hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.POST_SHARD_DATABASES:
+            return app_label == 'posts' and model_name == 'post'
+        return None
+
+
+class MergedQuerySet:
+    """One query run on every shard, merged by its ordering.
+
+    It covers what ``CursorPaginator`` needs: ``filter()``, ``order_by()``
+    on fields sorted in the same direction, ``[:n]`` and ``count()``. A
+    slice reads at most ``n`` rows from each shard and merges them with a
+    heap. Lookups passed to ``prefetch_related`` run once on the merged
+    rows rather than once per shard.
+    """
+
+    def __init__(self, querysets, ordering=(), prefetch=None):
+        if prefetch is None:
+            prefetch = querysets[0]._prefetch_related_lookups
+            querysets = [queryset.prefetch_related(None)
+                         for queryset in querysets]
+        self.querysets = querysets
+        self.ordering = ordering
+        self.prefetch = prefetch
+
+    def _chain(self, method, *args, **kwargs):
+        return MergedQuerySet(
+            [getattr(queryset, method)(*args, **kwargs)
+             for queryset in self.querysets],
+            self.ordering, self.prefetch,
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._chain('filter', *args, **kwargs)
+
+    def order_by(self, *fields):
+        merged = self._chain('order_by', *fields)
+        merged.ordering = fields
+        return merged
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.start or index.step:
+            raise TypeError('Merged querysets only support [:n] slices.')
+        rows = self._merge(index.stop)
+        if self.prefetch:
+            prefetch_related_objects(rows, *self.prefetch)
+        return rows
+
+    def _merge(self, limit):
+        names = [field.lstrip('-') for field in self.ordering]
+        directions = {field.startswith('-') for field in self.ordering}
+        if len(directions) > 1:
+            raise ValueError('Merged querysets need one sort direction.')
+        streams = [list(queryset[:limit]) for queryset in self.querysets]
+        merged = heapq.merge(*streams, key=attrgetter(*names),
+                             reverse=directions == {True})
+        return list(islice(merged, limit))
@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import counters, feeds, sharding
+from .models import Group, Post, User
+
+
+def saved_feeds(instance):
+    """Author and group ids as loaded, or None if they were deferred."""
+    fields = instance.__dict__
+    if 'author_id' not in fields or 'group_id' not in fields:
+        return None
+    return fields['author_id'], fields['group_id']
+
+
+@receiver(post_init, sender=Post)
+def remember_feeds(sender, instance, **kwargs):
+    instance._saved_feeds = saved_feeds(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old = instance._saved_feeds
+    new = (instance.author_id, instance.group_id)
+    if created:
+        counters.adjust(*new, delta=1)
+        for feed in feeds.post_feeds(*new):
+            feeds.bump_count(feed, 1)
+    elif old is not None and new != old:
+        (old_author_id, old_group_id), (author_id, group_id) = old, new
+        if old_author_id != author_id:
+            counters.adjust(author_id=old_author_id, delta=-1)
+            counters.adjust(author_id=author_id, delta=1)
+        if old_group_id != group_id:
+            counters.adjust(group_id=old_group_id, delta=-1)
+            counters.adjust(group_id=group_id, delta=1)
+        old_feeds = set(feeds.post_feeds(*old))
+        new_feeds = set(feeds.post_feeds(*new))
+        for feed in old_feeds - new_feeds:
+            feeds.bump_count(feed, -1)
+        for feed in new_feeds - old_feeds:
+            feeds.bump_count(feed, 1)
+    touched = set(feeds.post_feeds(*new))
+    if old is not None:
+        touched.update(feeds.post_feeds(*old))
+    for feed in touched:
+        feeds.bump_generation(feed)
+    instance._saved_feeds = new
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.adjust(instance.author_id, instance.group_id, delta=-1)
+    for feed in feeds.post_feeds(instance.author_id, instance.group_id):
+        feeds.bump_count(feed, -1)
+        feeds.bump_generation(feed)
+
+
+# On the shards posts are out of reach of the cascade from users, which
+# only looks at default.
+@receiver(pre_delete, sender=User)
+def author_deleting(sender, instance, **kwargs):
+    if sharding.enabled():
+        Post.objects.of_author(instance.pk).delete()
+
+
+def group_author_ids(group):
+    """Ids of the authors with posts in ``group``, on every shard."""
+    posts = Post.objects.filter(group_id=group.pk).order_by()
+    if sharding.enabled():
+        querysets = [posts.using(alias) for alias in settings.POST_SHARDS]
+    else:
+        querysets = [posts]
+    return {
+        author_id
+        for queryset in querysets
+        for author_id in queryset.values_list('author_id', flat=True)
+        .distinct()
+        if author_id is not None
+    }
+
+
+def bump_group_feeds(group, author_ids):
+    """Retire pages that show the group's title or link to it."""
+    touched = {feeds.ALL, feeds.feed_key(group_id=group.pk)}
+    touched.update(feeds.feed_key(author_id=author_id)
+                   for author_id in author_ids)
+    for feed in touched:
+        feeds.bump_generation(feed)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_group_feeds(instance, group_author_ids(instance))
+
+
+# The posts lose their group through a queryset update that sends no Post
+# signals, so their authors are looked up before the delete.
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    instance._feed_author_ids = group_author_ids(instance)
+    # SET_NULL, like the cascade from users, only reaches default.
+    if sharding.enabled():
+        for alias in settings.POST_SHARDS:
+            Post.objects.using(alias).filter(group_id=instance.pk).update(
+                group=None
+            )
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    bump_group_feeds(instance, getattr(instance, '_feed_author_ids', ()))
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files import locks
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import (ADD_LOCK, BUCKET_KEY, BUCKETS, FileCache, LocalStore,
+                        TwoLevelCache, bucket)
+
+SHARED = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+          'LOCATION': 'two-level-test'}
+
+
+@override_settings(CACHES={'default': SHARED, 'shared': SHARED})
+class TwoLevelCacheTest(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.cache = self.process()
+        self.other = self.process()
+
+    def process(self, **options):
+        """A cache as another worker process would see it."""
+        options = {'SYNC_INTERVAL': 0, 'LOCAL_TIMEOUT': 60, **options}
+        cache = TwoLevelCache('shared', {'OPTIONS': options})
+        cache.local = LocalStore(options.get('LOCAL_MAX_ENTRIES', 100))
+        return cache
+
+    def test_hits_are_served_from_process_memory(self):
+        self.cache.set('group', 'Первая')
+        caches['shared'].set('group', 'changed behind its back')
+        self.assertEqual(self.cache.get('group'), 'Первая')
+        self.assertEqual(self.other.get('group'), 'changed behind its back')
+
+    def test_writes_invalidate_other_processes(self):
+        self.other.set('count', 1)
+        self.assertEqual(self.cache.get('count'), 1)
+        self.other.incr('count', 5)
+        self.assertEqual(self.cache.get('count'), 6)
+        self.other.set_many({'count': 10, 'title': 'Вторая'})
+        self.assertEqual(self.cache.get_many(['count', 'title']),
+                         {'count': 10, 'title': 'Вторая'})
+        self.other.delete('count')
+        self.assertIsNone(self.cache.get('count'))
+
+    def test_writes_drop_only_their_bucket(self):
+        keys = {bucket(self.cache._full_key(key, None)): key
+                for key in map(str, range(2 * BUCKETS))}
+        first, second = list(keys.values())[:2]
+        self.cache.set_many({first: 1, second: 2})
+        self.cache.get_many([first, second])
+        self.cache._sync()
+        self.other.set(first, 10)
+        self.cache._sync()
+        self.assertNotIn(self.cache._full_key(first, None),
+                         self.cache.local.entries)
+        self.assertIn(self.cache._full_key(second, None),
+                      self.cache.local.entries)
+        self.assertEqual(self.cache.get(first), 10)
+
+    def test_add_is_not_broadcast(self):
+        self.cache._sync()
+        tokens = dict(self.cache.local.tokens)
+        self.assertTrue(self.other.add('lock', True))
+        self.assertFalse(self.cache.add('lock', True))
+        self.assertEqual(caches['shared'].get_many(list(tokens)), tokens)
+
+    def test_fills_after_a_miss_are_not_broadcast(self):
+        cache = self.process(SYNC_INTERVAL=60)
+        self.assertIsNone(cache.get('fragment'))
+        tokens = dict(cache.local.tokens)
+        cache.set('fragment', '<ul></ul>')
+        self.assertEqual(caches['shared'].get_many(list(tokens)), tokens)
+        cache.set('fragment', '<ol></ol>')
+        self.assertNotEqual(caches['shared'].get_many(list(tokens)), tokens)
+
+    def test_sync_interval_bounds_staleness(self):
+        cache = self.process(SYNC_INTERVAL=60)
+        self.assertIsNone(cache.get('key'))
+        self.other.set('key', 'old')
+        self.assertEqual(cache.get('key'), 'old')
+        self.other.set('key', 'new')
+        self.assertEqual(cache.get('key'), 'old')
+        cache.local.synced -= 60
+        self.assertEqual(cache.get('key'), 'new')
+
+    def test_lost_tokens_or_cleared_shared_cache_drop_entries(self):
+        self.cache.set('kept', 1)
+        self.cache.get('kept')
+        self.cache._sync()
+        caches['shared'].delete(
+            BUCKET_KEY.format(bucket(self.cache._full_key('kept', None)))
+        )
+        caches['shared'].set('kept', 'fresh')
+        self.assertEqual(self.cache.get('kept'), 'fresh')
+        self.other.clear()
+        self.assertIsNone(self.cache.get('kept'))
+
+    def test_local_tier_is_bounded(self):
+        cache = self.process(LOCAL_MAX_ENTRIES=2, LOCAL_TIMEOUT=5)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(len(cache.local.entries), 2)
+        self.assertEqual(cache.get('a'), 'a')
+        b = cache._full_key('b', None)
+        with mock.patch('core.cache.time.monotonic',
+                        return_value=cache.local.synced + 10):
+            cache.local.get(b)
+        self.assertNotIn(b, cache.local.entries)
+        cache.set('short', 1, timeout=0)
+        self.assertNotIn(cache._full_key('short', None), cache.local.entries)
+
+
+class FileCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = FileCache(directory.name, {})
+        self.lock_path = os.path.join(directory.name, ADD_LOCK)
+
+    def test_add_waits_for_the_add_in_progress(self):
+        self.assertTrue(self.cache.add('generation', 1))
+        self.assertFalse(self.cache.add('generation', 2))
+        results = []
+        with open(self.lock_path, 'a') as lock:
+            # Another process holds the lock between its check and write.
+            locks.lock(lock, locks.LOCK_EX)
+            adding = threading.Thread(target=lambda: results.append(
+                self.cache.add('lock', 'second')
+            ))
+            adding.start()
+            adding.join(0.1)
+            self.assertTrue(adding.is_alive())
+            self.cache.set('lock', 'first')
+            locks.unlock(lock)
+        adding.join()
+        self.assertEqual(results, [False])
+        self.assertEqual(self.cache.get('lock'), 'first')
+        self.cache.clear()
+        self.assertTrue(os.path.exists(self.lock_path))
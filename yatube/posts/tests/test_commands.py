@@ -0,0 +1,258 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import get_resolver, reverse
+
+from core import timing
+from core.management.commands import load_test
+from posts.models import AuthorStats, Group, Post
+
+User = get_user_model()
+
+
+class ExplainFeedsCommandTest(TestCase):
+    def test_seeds_and_explains_feeds_without_sorting(self):
+        out = StringIO()
+        call_command('explain_feeds', seed=50, users=3, groups=2, stdout=out)
+        output = out.getvalue()
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertEqual(
+            Post.objects.values('pub_date').distinct().count(), 50
+        )
+        for name in ('post_pub_date_idx', 'post_group_pub_date_idx',
+                     'post_author_pub_date_idx', 'group_timeline_idx',
+                     'author_timeline_idx'):
+            self.assertIn(name, output)
+        self.assertNotIn('TEMP B-TREE', output)
+
+
+class UpgradePostsCommandTest(TestCase):
+    def indexes(self):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(
+                cursor, Post._meta.db_table
+            ))
+
+    def test_adds_missing_indexes_once(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX post_pub_date_idx')
+            cursor.execute('DROP INDEX post_author_pub_date_idx')
+        out = StringIO()
+        call_command('upgrade_posts', stdout=out)
+        self.assertIn('Добавлено: post_pub_date_idx', out.getvalue())
+        self.assertIn('post_author_pub_date_idx', self.indexes())
+        out = StringIO()
+        call_command('upgrade_posts', stdout=out)
+        self.assertIn('Схема в порядке.', out.getvalue())
+
+    def test_adds_counter_column_and_recounts(self):
+        author = User.objects.create_user(username='old_author')
+        group = Group.objects.create(title='Старая', slug='old')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author, group=group)
+            for i in range(2)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE posts_group DROP COLUMN posts_count')
+        call_command('upgrade_posts', stdout=StringIO())
+        self.assertEqual(Group.objects.get(pk=group.pk).posts_count, 2)
+        self.assertEqual(AuthorStats.objects.get(author=author).posts_count,
+                         2)
+
+    def test_adds_rendered_columns_and_renders(self):
+        post = Post.objects.create(text='Первая\nвторая')
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE posts_post DROP COLUMN text_html')
+            cursor.execute('ALTER TABLE posts_post DROP COLUMN excerpt')
+        call_command('upgrade_posts', stdout=StringIO())
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.text_html, 'Первая<br>вторая')
+        self.assertEqual(post.excerpt, 'Первая вторая')
+
+
+class RecountPostsCommandTest(TestCase):
+    def test_recount_repairs_counters(self):
+        call_command('seed_posts', posts=40, users=4, groups=3,
+                     stdout=StringIO())
+        AuthorStats.objects.all().delete()
+        call_command('recount_posts', stdout=StringIO())
+        for group in Group.objects.all():
+            self.assertEqual(group.posts_count, group.posts.count())
+        stats = AuthorStats.objects.all()
+        self.assertEqual(sum(stat.posts_count for stat in stats), 40)
+        for stat in stats:
+            self.assertEqual(stat.posts_count,
+                             Post.objects.filter(author=stat.author).count())
+
+
+class ImportPostsCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def import_file(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, batch_size=2,
+                     stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_jsonl(self):
+        self.client.get(reverse('posts:index'))
+        out, err = self.import_file('.jsonl', '\n'.join([
+            '{"type": "user", "username": "leo", "first_name": "Лев"}',
+            '{"type": "group", "slug": "classics", "title": "Классика"}',
+            '{"text": "Первый", "author": "leo", "group": "classics", '
+            '"pub_date": "1877-01-01T10:00:00"}',
+            '{"text": "Второй", "author": "new_author"}',
+            '{"text": "Третий", "author": "leo"}',
+            'не json',
+            '{"text": ""}',
+        ]))
+        self.assertIn('Импортировано постов: 3, пропущено записей: 2', out)
+        self.assertIn('Запись 6 пропущена', err)
+        first = Post.objects.get(text='Первый')
+        self.assertEqual(first.pub_date.year, 1877)
+        self.assertEqual(first.author.first_name, 'Лев')
+        self.assertEqual(first.group.title, 'Классика')
+        self.assertEqual(first.group.posts_count, 1)
+        self.assertEqual(AuthorStats.objects.get(author=first.author)
+                         .posts_count, 2)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Второй')
+
+    def test_import_csv(self):
+        self.import_file('.csv', (
+            'type,username,slug,text,author,group\n'
+            'post,,,Пост из CSV,csv_author,csv-group\n'
+        ))
+        post = Post.objects.get()
+        self.assertEqual(post.author.username, 'csv_author')
+        self.assertEqual(post.group.slug, 'csv-group')
+
+
+class RenderPostsCommandTest(TestCase):
+    def test_backfills_empty_rows(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(text='Текст\nпоста', author=author)
+        Post.objects.filter(pk=post.pk).update(text_html='', excerpt='')
+        out = StringIO()
+        call_command('render_posts', batch_size=1, stdout=out)
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Текст<br>поста')
+        self.assertEqual(post.excerpt, 'Текст поста')
+        self.assertIn('1', out.getvalue())
+
+
+class ExportPostsCommandTest(TestCase):
+    def test_export_can_be_imported_back(self):
+        call_command('seed_posts', posts=30, users=2, groups=2,
+                     stdout=StringIO())
+        group = Group.objects.first()
+        out = StringIO()
+        call_command('export_posts', '--group', group.slug, stdout=out)
+        exported = list(Post.objects.filter(group=group).values_list(
+            'text', 'pub_date', 'author__username'
+        ))
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'w', encoding='utf-8') as stream:
+            stream.write(out.getvalue())
+        self.addCleanup(os.remove, path)
+        Post.objects.filter(group=group).delete()
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertCountEqual(
+            Post.objects.filter(group=group).values_list(
+                'text', 'pub_date', 'author__username'
+            ),
+            exported,
+        )
+
+
+class SeedAndBenchCommandTest(TestCase):
+    def seed(self):
+        call_command('seed_posts', posts=60, users=5, groups=3,
+                     batch_size=25, stdout=StringIO())
+        return list(Post.objects.order_by('pub_date').values_list(
+            'author__username', 'group__slug', 'text', 'pub_date'
+        ))
+
+    def test_seed_is_deterministic(self):
+        first = self.seed()
+        self.assertEqual(len(first), 60)
+        self.assertEqual(Group.objects.get(slug='seed-0').posts_count,
+                         Post.objects.filter(group__slug='seed-0').count())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertEqual(self.seed(), first)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_bench_covers_every_posts_view(self):
+        self.seed()
+        level = timing.logger.level
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            call_command('bench_views', repeat=1, output=path,
+                         stdout=StringIO())
+            self.assertEqual(timing.logger.level, level)
+            out = StringIO()
+            call_command('bench_views', repeat=1, output=path, compare=path,
+                         stdout=out)
+            with open(path) as stream:
+                data = json.load(stream)
+        self.assertEqual(data['meta']['posts'], 60)
+        results = data['results']
+        self.assertEqual({row['status'] for row in results}, {200})
+        names = {f'posts:{name}' for name in
+                 get_resolver('posts.urls').reverse_dict if
+                 isinstance(name, str)}
+        self.assertEqual({row['view'] for row in results}, names)
+        pages = {row['page'] for row in results
+                 if row['view'] == 'posts:profile'}
+        self.assertTrue({'first', 'middle', 'last'} <= pages)
+        self.assertIn('Сравнение', out.getvalue())
+
+
+class LoadTestCommandTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='load_author')
+        group = Group.objects.create(title='Группа', slug='load')
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+        call_command('recount_posts', stdout=StringIO())
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_replays_mix_against_wsgi_application(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'load.json')
+            level = timing.logger.level
+            call_command('load_test', workers=1, requests=30,
+                         mix={'index': 1, 'profile': 1, 'create': 2},
+                         output=path, stdout=StringIO())
+            self.assertEqual(timing.logger.level, level)
+            with open(path) as stream:
+                summary = json.load(stream)
+        self.assertEqual(summary['requests'], 30)
+        self.assertEqual(set(summary['statuses']), {'200', '302'})
+        self.assertEqual(summary['lock_errors'], 0)
+        self.assertEqual(Post.objects.count(),
+                         3 + summary['latency_ms']['create']['count'])
+        self.assertLessEqual(summary['latency_ms']['all']['p50'],
+                             summary['latency_ms']['all']['p99'])
+
+    def test_counts_lock_errors(self):
+        load_test._errors.locked = 0
+        try:
+            raise OperationalError('database is locked')
+        except OperationalError:
+            load_test.count_lock_errors(sender=None)
+        self.assertEqual(load_test._errors.locked, 1)
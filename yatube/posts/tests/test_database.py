@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.sqlite3.base import retry_locked
+
+
+class SqlitePragmaTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('temp_store'), 2)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_health_check(self):
+        connection.ensure_connection()
+        self.assertTrue(connection.is_usable())
+
+
+@override_settings(SQLITE_LOCK_RETRIES=3, SQLITE_LOCK_BACKOFF=0)
+class LockRetryTest(SimpleTestCase):
+    def execute(self, failures, message='database is locked'):
+        calls = []
+
+        def execute(sql, params, many, context):
+            calls.append(sql)
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return 'done'
+
+        return execute, calls
+
+    def context(self, in_atomic_block=False):
+        return {'connection': mock.Mock(in_atomic_block=in_atomic_block)}
+
+    def test_retries_lock_errors(self):
+        execute, calls = self.execute(failures=2)
+        self.assertEqual(
+            retry_locked(execute, 'SQL', (), False, self.context()), 'done'
+        )
+        self.assertEqual(len(calls), 3)
+
+    def test_gives_up_after_retries(self):
+        execute, calls = self.execute(failures=10)
+        with self.assertRaises(OperationalError):
+            retry_locked(execute, 'SQL', (), False, self.context())
+        self.assertEqual(len(calls), 4)
+
+    def test_no_retry_inside_transaction_or_for_other_errors(self):
+        for context, message in (
+            (self.context(in_atomic_block=True), 'database is locked'),
+            (self.context(), 'no such table: posts_post'),
+        ):
+            with self.subTest(message=message):
+                execute, calls = self.execute(failures=1, message=message)
+                with self.assertRaises(OperationalError):
+                    retry_locked(execute, 'SQL', (), False, context)
+                self.assertEqual(len(calls), 1)
@@ -0,0 +1,141 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import decorators
+from posts.decorators import page_cache_key
+from posts.models import Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='page_cache_user')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_detail',
+                           kwargs={'post_id': self.post.id})
+
+    def test_anonymous_pages_are_cached_until_a_post_is_written(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Тестовый пост')
+        Post.objects.filter(pk=self.post.pk).update(text='Другой текст')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'hit')
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'Новый текст')
+
+    def test_logged_in_pages_are_not_cached(self):
+        author = Client()
+        author.force_login(self.user)
+        author.get(self.url)
+        response = author.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'Редактировать пост')
+        self.assertNotContains(self.client.get(self.url), 'Редактировать')
+
+    @override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=0)
+    def test_expired_page_is_rebuilt_by_one_request(self):
+        self.client.get(self.url)
+        request = self.client.get(self.url).wsgi_request
+        lock_key = f'{page_cache_key(request)}:lock'
+        cache.add(lock_key, True)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+        cache.delete(lock_key)
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertIsNone(cache.get(lock_key))
+
+    def test_write_serves_stale_while_one_request_rebuilds(self):
+        request = self.client.get(self.url).wsgi_request
+        self.post.text = 'Новый текст'
+        self.post.save()
+        lock_key = f'{page_cache_key(request)}:lock'
+        cache.add(lock_key, True)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+        self.assertContains(response, 'Тестовый пост')
+        cache.delete(lock_key)
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'Новый текст')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'hit')
+
+    def test_cold_miss_waits_for_the_request_rendering_it(self):
+        request = self.client.get(self.url).wsgi_request
+        key = page_cache_key(request)
+        entry = cache.get(key)
+        cache.delete(key)
+        cache.add(f'{key}:lock', True)
+
+        def rendered(seconds):
+            cache.set(key, entry)
+
+        with mock.patch.object(decorators.time, 'sleep',
+                               side_effect=rendered) as sleep:
+            with self.assertNumQueries(1):
+                response = self.client.get(self.url)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Тестовый пост')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='etag_user')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'etag_user'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_unchanged_pages_return_304(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                with self.assertNumQueries(0 if url == '/' else 1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_post_edit_changes_validators(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Новый текст')
+
+    def test_logged_in_user_gets_own_etag(self):
+        client = Client()
+        client.force_login(self.user)
+        url = self.urls[2]
+        response = client.get(url)
+        self.assertNotEqual(response['ETag'], self.client.get(url)['ETag'])
+        self.assertFalse(response.has_header('Last-Modified'))
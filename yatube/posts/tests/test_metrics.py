@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.store.reset()
+        self.addCleanup(metrics.store.reset)
+
+    def write_other_process(self, rows, name='1.json'):
+        with open(os.path.join(self.directory, name), 'w') as stream:
+            json.dump(rows, stream)
+
+    def test_samples_of_all_processes_are_added_up(self):
+        self.write_other_process([
+            ['yatube_requests_total', ['posts:index', '200'], None, 3],
+            ['yatube_request_duration_seconds', ['posts:index'], 0.05, 3],
+            ['yatube_request_duration_seconds', ['posts:index'], '+Inf', 3],
+            ['yatube_request_duration_seconds', ['posts:index'], 'sum', 0.1],
+        ])
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      lines)
+        self.assertIn('yatube_requests_total'
+                      '{url_name="posts:index",status="200"} 5.0', lines)
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{url_name="posts:index"} 5.0', lines)
+        self.assertIn('yatube_request_queries_bucket'
+                      '{url_name="posts:index",le="+Inf"} 2.0', lines)
+        self.assertIn('yatube_cache_requests_total'
+                      '{cache="page",result="miss"} 1.0', lines)
+        self.assertIn('yatube_cache_requests_total'
+                      '{cache="page",result="hit"} 1.0', lines)
+
+    def test_forked_process_starts_empty(self):
+        metrics.inc(metrics.REQUESTS, 'posts:index', 200)
+        metrics.store.pid = -1
+        metrics.store.flush(force=True)
+        self.assertEqual(metrics.collect(), {})
+
+    def test_exited_workers_are_archived(self):
+        exited = subprocess.run([sys.executable, '-c', 'import os; '
+                                 'print(os.getpid())'],
+                                capture_output=True, text=True)
+        row = ['yatube_requests_total', ['posts:index', '200'], None, 2]
+        self.write_other_process([row], f'{exited.stdout.strip()}-a.json')
+        # A previous process with this process's pid.
+        self.write_other_process([row], f'{os.getpid()}-b.json')
+        self.write_other_process([row])
+        key = ('yatube_requests_total', ('posts:index', '200'), None)
+        self.assertEqual(metrics.collect()[key], 6)
+        self.assertEqual(metrics.collect()[key], 6)
+        self.assertEqual(
+            {name for name in os.listdir(self.directory)
+             if name.endswith('.json')},
+            {'1.json', metrics.ARCHIVE, metrics.store.name()},
+        )
+
+    def test_archived_file_left_behind_is_not_added_twice(self):
+        row = ['yatube_requests_total', ['posts:index', '200'], None, 2]
+        self.write_other_process({'files': ['1.json'], 'rows': [row]},
+                                 metrics.ARCHIVE)
+        self.write_other_process([row])
+        key = ('yatube_requests_total', ('posts:index', '200'), None)
+        self.assertEqual(metrics.collect()[key], 2)
+        self.assertNotIn('1.json', os.listdir(self.directory))
@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from posts.models import Post, Group
+from posts.models import AuthorStats, Group, Post
 
 User = get_user_model()
 
@@ -29,3 +29,71 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_object_name = post.text[:15]
         self.assertEqual(expected_object_name, str(post))
+
+
+class PostCountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        self.group = Group.objects.create(title='Группа', slug='group')
+        self.other_group = Group.objects.create(title='Другая', slug='other')
+
+    def assertCounts(self, author, other, group, other_group):
+        for user, expected in ((self.author, author), (self.other, other)):
+            user = User.objects.select_related('post_stats').get(pk=user.pk)
+            self.assertEqual(AuthorStats.posts_count_of(user), expected)
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, group)
+        self.assertEqual(self.other_group.posts_count, other_group)
+
+    def test_counters_follow_post_writes(self):
+        post = Post.objects.create(
+            text='Текст', author=self.author, group=self.group
+        )
+        Post.objects.create(text='Текст', author=self.author)
+        self.assertCounts(2, 0, 1, 0)
+        post.author = self.other
+        post.group = self.other_group
+        post.save()
+        self.assertCounts(1, 1, 0, 1)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertCounts(1, 1, 0, 1)
+        post.delete()
+        self.assertCounts(1, 0, 0, 0)
+
+
+class PostRenderingTest(TestCase):
+    TEXT = 'Первая <строка>\n' + ' '.join(['слово'] * 40)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+
+    def assertRendered(self, post):
+        post.refresh_from_db()
+        self.assertTrue(post.text_html.startswith(
+            'Первая &lt;строка&gt;<br>слово'
+        ))
+        self.assertEqual(len(post.excerpt.split()), 31)
+        self.assertTrue(post.excerpt.endswith('слово …'))
+
+    def test_create_renders_text(self):
+        self.assertRendered(
+            Post.objects.create(text=self.TEXT, author=self.author)
+        )
+
+    def test_bulk_paths_render_text(self):
+        Post.objects.bulk_create([Post(text=self.TEXT, author=self.author)])
+        post = Post.objects.get()
+        self.assertRendered(post)
+        Post.objects.update(text='Короткий\nтекст')
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Короткий<br>текст')
+        self.assertEqual(post.excerpt, 'Короткий текст')
+
+    def test_update_fields_include_rendered_text(self):
+        post = Post.objects.create(text='Старый', author=self.author)
+        post.text = self.TEXT
+        post.save(update_fields=['text'])
+        self.assertRendered(post)
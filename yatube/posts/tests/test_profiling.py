@@ -0,0 +1,74 @@
+import os
+import pstats
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='profiled')
+        Post.objects.create(text='Пост', author=cls.user)
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(
+            PROFILING_DIR=self.directory, PROFILING_TOKEN='secret',
+            PROFILING_KEEP=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = reverse('posts:profile', kwargs={'username': 'profiled'})
+
+    def test_profiles_requests_with_token(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE='secret')
+        name = response['X-Profile']
+        self.assertTrue(name.startswith('posts_profile-'))
+        stats = pstats.Stats(os.path.join(self.directory, name))
+        self.assertTrue(any(function == 'profile'
+                            for _, _, function in stats.stats))
+        response = self.client.get(self.url, HTTP_X_PROFILE='wrong')
+        self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_non_ascii_token_header_is_refused(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE='sécret')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('X-Profile'))
+
+    def test_keeps_newest_profiles(self):
+        for _ in range(3):
+            self.client.get(self.url, HTTP_X_PROFILE='secret')
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_requests_are_profiled(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.has_header('X-Profile'))
+
+    def test_staff_lists_and_downloads_profiles(self):
+        name = self.client.get(self.url, HTTP_X_PROFILE='secret')['X-Profile']
+        response = self.client.get(reverse('profile_list'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('profile_list'))
+        self.assertContains(response, name)
+        response = self.client.get(reverse('profile_download', args=[name]))
+        self.assertIn('attachment', response['Content-Disposition'])
+        response = self.client.get(
+            reverse('profile_download', args=['missing.prof'])
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+
+from core import routers
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        token = routers._wrote.set(False)
+        self.addCleanup(routers._wrote.reset, token)
+
+    def read(self, model):
+        return self.router.db_for_read(model)
+
+    def test_only_wrapped_views_read_from_replicas(self):
+        self.assertEqual(self.read(Post), 'default')
+        view = routers.read_from_replica(lambda request: self.read(Post))
+        self.assertEqual(view(None), 'replica')
+        self.assertEqual(self.read(Post), 'default')
+
+    def test_sessions_and_writes_stay_on_primary(self):
+        view = routers.read_from_replica(lambda request: (
+            self.read(User), self.read(Session),
+            self.router.db_for_write(Post), self.read(Post),
+        ))
+        self.assertEqual(view(None),
+                         ('replica', 'default', 'default', 'default'))
+
+    def test_request_user_is_loaded_from_primary(self):
+        loaded_from = []
+
+        def get_user():
+            loaded_from.append(self.read(User))
+            return AnonymousUser()
+
+        request = RequestFactory().get('/')
+        request.user = SimpleLazyObject(get_user)
+        routers.read_from_replica(lambda request: None)(request)
+        self.assertEqual(loaded_from, ['default'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaPinTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='replica_author')
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(routers, 'choose_replica',
+                                    return_value='default')
+        self.choose_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_go_to_replica(self):
+        self.client.get(reverse('posts:index'))
+        self.assertTrue(self.choose_replica.called)
+        self.client.get(reverse('posts:post_create'))
+        self.assertFalse(self.client.cookies.get(routers.PIN_COOKIE))
+
+    def test_author_is_pinned_to_primary_after_posting(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'Свежий пост'})
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.choose_replica.reset_mock()
+        response = self.client.get(reverse(
+            'posts:profile', kwargs={'username': 'replica_author'}
+        ))
+        self.assertContains(response, 'Свежий пост')
+        self.assertFalse(self.choose_replica.called)
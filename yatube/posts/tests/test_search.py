@@ -0,0 +1,71 @@
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from yatube import settings
+
+User = get_user_model()
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='search_user')
+        cls.cats = Post.objects.create(
+            text='Кошки любят спать. Кошки везде.', author=cls.user
+        )
+        cls.dogs = Post.objects.create(
+            text='Собаки и кошки живут вместе', author=cls.user
+        )
+        Post.objects.create(text='Про погоду', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_is_ranked_and_case_insensitive(self):
+        self.assertEqual(list(Post.objects.search('КОШКИ')),
+                         [self.cats, self.dogs])
+        self.assertEqual(list(Post.objects.search('кошки собаки')),
+                         [self.dogs])
+        self.assertFalse(Post.objects.search('   ').exists())
+        self.assertFalse(Post.objects.search('"AND OR ( *').exists())
+        self.assertEqual(
+            list(Post.objects.search('кошки', ranked=False).order_by('pk')),
+            [self.cats, self.dogs],
+        )
+
+    def test_index_follows_writes(self):
+        self.dogs.text = 'Только собаки'
+        self.dogs.save()
+        self.assertEqual(list(Post.objects.search('кошки')), [self.cats])
+        Post.objects.filter(pk=self.cats.pk).update(text='Попугаи')
+        self.assertFalse(Post.objects.search('кошки').exists())
+        Post.objects.bulk_create([Post(text='Кошки снова', author=self.user)])
+        self.assertEqual(Post.objects.search('кошки').count(), 1)
+        Post.objects.filter(text='Кошки снова').delete()
+        self.assertFalse(Post.objects.search('кошки').exists())
+
+    def test_search_view_paginates_and_keeps_query(self):
+        for _ in range(settings.POST_COUNT):
+            Post.objects.create(text='Ещё про кошек и кошки', author=self.user)
+        response = self.client.get(reverse('posts:search'), {'q': 'кошки'})
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.POST_COUNT)
+        next_page = '?' + urlencode({'q': 'кошки', 'page': 2})
+        self.assertContains(response, next_page.replace('&', '&amp;'))
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'кошки', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get('/admin/posts/post/', {'q': 'собаки'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.dogs])
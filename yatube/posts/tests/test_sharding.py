@@ -0,0 +1,222 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters, sharding
+from posts.models import AuthorStats, Group, Post
+
+User = get_user_model()
+
+SHARDS = ['posts_shard_0', 'posts_shard_1']
+
+
+@override_settings(POST_SHARDS=SHARDS, POST_COUNT=3)
+class ShardingTest(TestCase):
+    databases = {'default', *SHARDS}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Шарды', slug='shards')
+        cls.authors = [User.objects.create_user(username=f'shard_user_{i}')
+                       for i in range(4)]
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', group=cls.group,
+                                author=cls.authors[i % 4])
+            for i in range(8)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def captured(self):
+        return {alias: CaptureQueriesContext(connections[alias])
+                for alias in SHARDS}
+
+    def get(self, url):
+        contexts = self.captured()
+        for context in contexts.values():
+            context.__enter__()
+        try:
+            response = self.client.get(url)
+        finally:
+            for context in contexts.values():
+                context.__exit__(None, None, None)
+        return response, {alias: len(context)
+                          for alias, context in contexts.items()}
+
+    def test_posts_live_on_their_author_shard(self):
+        self.assertFalse(Post.objects.using('default').exists())
+        for post in self.posts:
+            shard = sharding.author_shard(post.author_id)
+            self.assertEqual(post._state.db, shard)
+            self.assertEqual(sharding.post_shard(post.pk), shard)
+            self.assertTrue(Post.objects.using(shard).filter(
+                pk=post.pk, author_id=post.author_id
+            ).exists())
+
+    def test_bulk_create_spreads_posts_over_shards(self):
+        created = Post.objects.bulk_create(
+            Post(text=f'Пачка {i}', author=author)
+            for i, author in enumerate(self.authors)
+        )
+        for post in created:
+            self.assertEqual(sharding.post_shard(post.pk),
+                             sharding.author_shard(post.author_id))
+        self.assertEqual(len({post.pk for post in created}), len(created))
+
+    def test_profile_and_post_detail_read_one_shard(self):
+        author = self.authors[1]
+        shard = sharding.author_shard(author.pk)
+        other = next(alias for alias in SHARDS if alias != shard)
+        response, queries = self.get(reverse(
+            'posts:profile', kwargs={'username': author.username}
+        ))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.posts[5], self.posts[1]])
+        self.assertEqual(queries[other], 0)
+        response, queries = self.get(reverse(
+            'posts:post_detail', args=[self.posts[1].pk]
+        ))
+        self.assertEqual(response.context['post'], self.posts[1])
+        self.assertEqual(response.context['post'].author, author)
+        self.assertEqual(queries[other], 0)
+
+    def test_index_merges_shards_in_feed_order(self):
+        seen = []
+        url = reverse('posts:index')
+        cursor = ''
+        while True:
+            response, queries = self.get(f'{url}?cursor={cursor}')
+            page = response.context['page_obj']
+            seen.extend(page)
+            self.assertEqual(queries, {alias: 1 for alias in SHARDS})
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.posts[::-1])
+        self.assertEqual(seen[0].author, self.authors[3])
+        self.assertEqual(seen[0].group, self.group)
+
+    def test_merged_slice_reads_a_page_from_each_shard(self):
+        merged = Post.objects.for_feed().sharded().order_by('-pub_date',
+                                                            '-pk')
+        contexts = self.captured()
+        with contexts[SHARDS[0]], contexts[SHARDS[1]]:
+            self.assertEqual(merged[:4], self.posts[:-5:-1])
+        for context in contexts.values():
+            self.assertEqual(len(context), 1)
+            self.assertIn('LIMIT 4', context[0]['sql'])
+        self.assertEqual(merged.count(), len(self.posts))
+
+    def test_group_feed_and_edit_on_shard(self):
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[:-4:-1])
+        post = self.posts[2]
+        self.client.force_login(post.author)
+        self.client.post(reverse('posts:post_edit', args=[post.pk]),
+                         {'text': 'Правка в шарде'})
+        shard = sharding.post_shard(post.pk)
+        self.assertEqual(Post.objects.using(shard).get(pk=post.pk).text,
+                         'Правка в шарде')
+
+    def test_author_change_moves_post_to_new_shard(self):
+        old, new = self.authors[1], self.authors[3]
+        old_shard = sharding.author_shard(old.pk)
+        new_shard = sharding.author_shard(new.pk)
+        self.assertNotEqual(old_shard, new_shard)
+        post = Post.objects.of_post(self.posts[1].pk).get()
+        old_pk, pub_date = post.pk, post.pub_date
+        post.author = new
+        post.text = 'Другой автор'
+        post.save()
+        self.assertEqual(post._state.db, new_shard)
+        self.assertEqual(sharding.post_shard(post.pk), new_shard)
+        self.assertFalse(
+            Post.objects.using(old_shard).filter(pk=old_pk).exists()
+        )
+        moved = Post.objects.of_post(post.pk).get()
+        self.assertEqual((moved.author, moved.text, moved.pub_date),
+                         (new, 'Другой автор', pub_date))
+        self.assertEqual(moved.text_html, 'Другой автор')
+        self.assertEqual(
+            dict(AuthorStats.objects.filter(author__in=[old, new])
+                 .values_list('author_id', 'posts_count')),
+            {old.pk: 1, new.pk: 3},
+        )
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 8)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': new.username})
+        )
+        self.assertIn(moved, response.context['page_obj'])
+
+    def test_deletes_reach_the_shards(self):
+        author = User.objects.get(pk=self.authors[3].pk)
+        shard = sharding.author_shard(author.pk)
+        author.delete()
+        self.assertFalse(Post.objects.using(shard).filter(
+            author_id=self.authors[3].pk
+        ).exists())
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 6)
+        Group.objects.get(pk=self.group.pk).delete()
+        for alias in SHARDS:
+            self.assertFalse(Post.objects.using(alias).filter(
+                group__isnull=False
+            ).exists())
+
+    def test_recount_adds_up_shards(self):
+        AuthorStats.objects.all().delete()
+        Group.objects.update(posts_count=0)
+        counters.recount()
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 8)
+        self.assertEqual(
+            dict(AuthorStats.objects.values_list('author_id', 'posts_count')),
+            {author.pk: 2 for author in self.authors},
+        )
+
+    def test_api_reads_shards(self):
+        ids = []
+        url = reverse('posts:api_index')
+        cursor = ''
+        while cursor is not None:
+            data = self.client.get(f'{url}?cursor={cursor}').json()
+            ids.extend(row['id'] for row in data['results'])
+            cursor = data['next']
+        self.assertEqual(ids, [post.pk for post in self.posts[::-1]])
+        author = self.authors[1]
+        data = self.client.get(reverse(
+            'posts:api_profile', kwargs={'username': author.username}
+        )).json()
+        self.assertEqual([row['id'] for row in data['results']],
+                         [self.posts[5].pk, self.posts[1].pk])
+        self.assertEqual(data['results'][0]['group'], self.group.slug)
+        data = self.client.get(reverse(
+            'posts:api_post_detail', args=[self.posts[1].pk]
+        )).json()
+        self.assertEqual(data['author'], {'username': author.username,
+                                          'full_name': '',
+                                          'posts_count': 2})
+
+    def test_search_and_export_read_shards(self):
+        response = self.client.get(reverse('posts:search'), {'q': 'Пост 3'})
+        self.assertEqual(list(response.context['page_obj']), [self.posts[3]])
+        response = self.client.get(reverse('posts:search'), {'q': 'Пост'})
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[:-4:-1])
+        response = self.client.get(reverse(
+            'posts:group_export', kwargs={'slug': self.group.slug}
+        ))
+        rows = [json.loads(line) for line
+                in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows],
+                         [post.pk for post in self.posts[::-1]])
+        self.assertEqual(rows[0]['author'], self.authors[3].username)
+        self.assertEqual(rows[0]['group'], self.group.slug)
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.slow_queries import normalize
+from posts.models import Post
+
+User = get_user_model()
+
+
+class NormalizeTest(TestCase):
+    def test_literals_and_in_lists_are_folded(self):
+        self.assertEqual(
+            normalize('SELECT *  FROM "t" WHERE "id" IN (%s, %s, %s)\n'
+                      "AND \"x\" = 'a''b' LIMIT 21"),
+            'SELECT * FROM "t" WHERE "id" IN (...) AND "x" = ? LIMIT ?',
+        )
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='slow_user')
+        Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_logs_queries_with_view_and_plan(self):
+        with self.assertLogs('yatube.slow_queries') as logs:
+            self.client.get(reverse(
+                'posts:profile', kwargs={'username': 'slow_user'}
+            ))
+        records = [json.loads(record.getMessage())
+                   for record in logs.records]
+        self.assertTrue(records)
+        self.assertEqual({record['view'] for record in records},
+                         {'posts:profile'})
+        posts_query = next(record for record in records
+                           if '"posts_post"' in record['sql']
+                           and 'plan' in record)
+        self.assertIn('posts_post', ' '.join(posts_query['plan']))
+
+    def test_command_aggregates_log(self):
+        lines = [
+            {'fingerprint': 'a', 'sql': 'SELECT a', 'duration_ms': 5.0,
+             'view': 'posts:index'},
+            {'fingerprint': 'b', 'sql': 'SELECT b', 'duration_ms': 1.0,
+             'view': 'posts:index', 'plan': ['SCAN b']},
+            {'fingerprint': 'b', 'sql': 'SELECT b', 'duration_ms': 7.0,
+             'view': 'posts:profile'},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.log')
+            with open(path, 'w') as stream:
+                stream.write(json.dumps(lines[0]) + '\n')
+            with open(f'{path}.1', 'w') as stream:
+                for line in lines[1:]:
+                    stream.write(json.dumps(line) + '\n')
+            out = StringIO()
+            call_command('slow_queries', file=path, stdout=out)
+        output = out.getvalue().splitlines()
+        self.assertTrue(output[0].startswith('b  2 раз, всего 8.0 мс'))
+        self.assertIn('posts:index, posts:profile', output[0])
+        self.assertEqual(output[2], '    > SCAN b')
+        self.assertTrue(output[3].startswith('a  1 раз'))
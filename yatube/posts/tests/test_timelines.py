@@ -0,0 +1,170 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import timelines
+from posts.models import AuthorTimeline, Group, GroupTimeline, Post
+
+User = get_user_model()
+
+
+class TimelineTriggerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='timeline_author')
+        cls.group = Group.objects.create(title='Первая', slug='first')
+        cls.other_group = Group.objects.create(title='Вторая', slug='second')
+
+    def entries(self, post):
+        return (
+            list(GroupTimeline.objects.filter(pk=post.pk)
+                 .values_list('group_id', 'pub_date')),
+            list(AuthorTimeline.objects.filter(pk=post.pk)
+                 .values_list('author_id', 'pub_date')),
+        )
+
+    def test_create_moves_and_delete(self):
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   group=self.group)
+        self.assertEqual(self.entries(post), (
+            [(self.group.pk, post.pub_date)],
+            [(self.author.pk, post.pub_date)],
+        ))
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.entries(post)[0],
+                         [(self.other_group.pk, post.pub_date)])
+        post.group = None
+        post.save()
+        self.assertEqual(self.entries(post),
+                         ([], [(self.author.pk, post.pub_date)]))
+        post.delete()
+        self.assertEqual(self.entries(post), ([], []))
+
+    def test_bulk_writes_and_group_delete(self):
+        old_group, new_group = (
+            Group.objects.create(title=slug, slug=slug)
+            for slug in ('old', 'new')
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.author, group=old_group)
+            for i in range(3)
+        )
+        self.assertEqual(
+            GroupTimeline.objects.filter(group=old_group).count(), 3
+        )
+        Post.objects.filter(group=old_group).update(group=new_group)
+        self.assertFalse(
+            GroupTimeline.objects.filter(group=old_group).exists()
+        )
+        self.assertEqual(
+            GroupTimeline.objects.filter(group=new_group).count(), 3
+        )
+        new_group.delete()
+        self.assertFalse(GroupTimeline.objects.exists())
+        self.assertEqual(AuthorTimeline.objects.count(), 3)
+
+
+class TimelineFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='feed_author')
+        cls.group = Group.objects.create(title='Лента', slug='feed')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author,
+                                group=cls.group if i % 2 else None)
+            for i in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, view, query='', **kwargs):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(view, kwargs=kwargs) + query)
+        return response, ' '.join(item['sql'] for item in captured)
+
+    @override_settings(POST_COUNT=2)
+    def test_feeds_read_timelines(self):
+        response, sql = self.get('posts:group_list', slug=self.group.slug)
+        self.assertIn('posts_grouptimeline', sql)
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.posts[5], self.posts[3]])
+        response, sql = self.get('posts:profile', '?page=3',
+                                 username=self.author.username)
+        self.assertIn('posts_authortimeline', sql)
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.posts[2], self.posts[1]])
+        response, _ = self.get('posts:profile', '?cursor=',
+                               username=self.author.username)
+        first_page = response.context['page_obj']
+        response, _ = self.get(
+            'posts:profile', f'?cursor={first_page.next_cursor}',
+            username=self.author.username,
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.posts[4], self.posts[3]])
+        previous = response.context['page_obj'].previous_cursor
+        response, _ = self.get('posts:profile', f'?cursor={previous}',
+                               username=self.author.username)
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+    @override_settings(POST_TIMELINES=False)
+    def test_feeds_without_timelines(self):
+        response, sql = self.get('posts:group_list', slug=self.group.slug)
+        self.assertNotIn('posts_grouptimeline', sql)
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+
+class TimelineRepairTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='repair_author')
+        group = Group.objects.create(title='Ремонт', slug='repair')
+        cls.posts = [Post.objects.create(text=f'Пост {i}', author=author,
+                                         group=group)
+                     for i in range(5)]
+
+    def drift(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_grouptimeline '
+                           'WHERE post_id = %s', [self.posts[0].pk])
+            cursor.execute('UPDATE posts_authortimeline SET pub_date = %s '
+                           'WHERE post_id = %s',
+                           ['2000-01-01 00:00:00', self.posts[1].pk])
+            cursor.execute('INSERT INTO posts_grouptimeline '
+                           '(post_id, group_id, pub_date) VALUES (%s, 1, %s)',
+                           [self.posts[-1].pk + 100, '2000-01-01 00:00:00'])
+
+    def test_scan_finds_and_fixes_drift(self):
+        self.drift()
+        self.assertEqual(timelines.check(batch_size=2), {
+            'posts_grouptimeline': (1, 1),
+            'posts_authortimeline': (1, 1),
+        })
+        for _ in timelines.scan(batch_size=2, fix=True):
+            pass
+        self.assertEqual(timelines.check(batch_size=2), {
+            'posts_grouptimeline': (0, 0),
+            'posts_authortimeline': (0, 0),
+        })
+
+    def test_commands(self):
+        self.drift()
+        with self.assertRaises(CommandError):
+            call_command('check_timelines', stdout=StringIO())
+        call_command('rebuild_timelines', batch_size=3, stdout=StringIO())
+        out = StringIO()
+        call_command('check_timelines', stdout=out)
+        self.assertIn('posts_grouptimeline: не хватает 0, лишних 0',
+                      out.getvalue())
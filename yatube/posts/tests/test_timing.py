@@ -0,0 +1,44 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='timing_user')
+        Post.objects.create(text='Пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_and_log_line(self):
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            response = self.client.get(reverse(
+                'posts:profile', kwargs={'username': 'timing_user'}
+            ))
+        metrics = [part.split(';')[0]
+                   for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['db', 'tpl', 'view', 'total'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['url_name'], 'posts:profile')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['view_ms'])
+
+    def test_unresolved_path_is_logged(self):
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            response = self.client.get('/no/such/page/')
+        self.assertEqual(response.status_code, 404)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertIsNone(record['url_name'])
+        self.assertEqual(record['queries'], 0)
@@ -1,8 +1,15 @@
+import csv
+import io
+import json
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_init
 from django.test import Client, TestCase
 from django.urls import reverse
 
 from posts.models import Group, Post
+from posts.tests.utils import QueryBudgetMixin
 from yatube import settings
 
 User = get_user_model()
@@ -10,6 +17,7 @@ User = get_user_model()
 
 class TaskPagesTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='test_user')
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -142,6 +150,9 @@ class PaginatorTests(TestCase):
                 group=cls.group
             )
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_contains_ten_records(self):
         response = self.client.get(reverse('posts:index'))
         self.assertEqual(len(response.context['page_obj']),
@@ -184,3 +195,333 @@ class PaginatorTests(TestCase):
             }) + '?page=2'
         )
         self.assertEqual(len(response.context['page_obj']), 3)
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor_user')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.user)
+            for i in range(settings.POST_COUNT + 3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_walks_feed_both_ways(self):
+        response = self.client.get(reverse('posts:index') + '?cursor=')
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), settings.POST_COUNT)
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        response = self.client.get(
+            reverse('posts:index') + f'?cursor={first_page.next_cursor}'
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(second_page[-1], self.posts[0])
+        response = self.client.get(
+            reverse('posts:index')
+            + f'?cursor={second_page.previous_cursor}'
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        ) + '?cursor=garbage')
+        self.assertEqual(response.context['page_obj'][0], self.posts[-1])
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Группа', slug='budget')
+        for i in range(20):
+            author = User.objects.create_user(
+                username=f'budget_user_{i}', first_name='Имя',
+            )
+            cls.post = Post.objects.create(
+                text='Тестовый текст', author=author, group=cls.group,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_fit_query_budget(self):
+        budgets = {
+            reverse('posts:index'): 2,
+            reverse('posts:index') + '?cursor=': 1,
+            reverse('posts:group_list', kwargs={'slug': 'budget'}): 4,
+            reverse('posts:profile',
+                    kwargs={'username': self.post.author.username}): 4,
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.id}): 2,
+        }
+        for url, budget in budgets.items():
+            self.assertQueryBudget(url, budget)
+
+
+class CachedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='count_user')
+        cls.group = Group.objects.create(title='Группа', slug='count')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+        for _ in range(settings.POST_COUNT):
+            cls.post = Post.objects.create(
+                text='Тестовый текст', author=cls.user, group=cls.group,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_count(self, url):
+        return self.client.get(url).context['page_obj'].paginator.count
+
+    def test_count_is_cached_and_bumped_on_write(self):
+        index = reverse('posts:index')
+        group = reverse('posts:group_list', kwargs={'slug': 'count'})
+        other = reverse('posts:group_list', kwargs={'slug': 'other'})
+        self.assertEqual(self.get_count(index), settings.POST_COUNT)
+        self.assertEqual(self.get_count(group), settings.POST_COUNT)
+        self.assertEqual(self.get_count(other), 0)
+        with self.assertNumQueries(0):
+            self.client.get(index)
+        Post.objects.create(text='Новый', author=self.user, group=self.group)
+        self.assertEqual(self.get_count(index), settings.POST_COUNT + 1)
+        self.assertEqual(self.get_count(group), settings.POST_COUNT + 1)
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertEqual(self.get_count(group), settings.POST_COUNT)
+        self.assertEqual(self.get_count(other), 1)
+        self.post.delete()
+        self.assertEqual(self.get_count(index), settings.POST_COUNT)
+        self.assertEqual(self.get_count(other), 0)
+
+    def test_post_without_author_is_counted_once(self):
+        index = reverse('posts:index')
+        self.assertEqual(self.get_count(index), settings.POST_COUNT)
+        post = Post.objects.create(text='Без автора', author=None)
+        self.assertEqual(self.get_count(index), settings.POST_COUNT + 1)
+        post.delete()
+        self.assertEqual(self.get_count(index), settings.POST_COUNT)
+
+    def test_profile_counts_posts_once(self):
+        url = reverse('posts:profile', kwargs={'username': 'count_user'})
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.context['count'], settings.POST_COUNT)
+
+    def test_estimate_uses_largest_id_for_index(self):
+        modes = {**settings.POST_PAGINATION, 'posts:index': 'estimate'}
+        with self.settings(POST_PAGINATION=modes):
+            count = self.get_count(reverse('posts:index'))
+        self.assertEqual(count, Post.objects.latest('pk').pk)
+
+
+class PagerRenderTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='pager_user')
+        for _ in range(40):
+            Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pager_is_windowed_and_rendered_once(self):
+        url = reverse('posts:profile', kwargs={'username': 'pager_user'})
+        with self.settings(POST_COUNT=1):
+            response = self.client.get(url + '?page=20')
+        content = response.content.decode()
+        self.assertEqual(content.count('aria-label="Page navigation"'), 1)
+        for page in ('?page=1"', '?page=17"', '?page=23"', '?page=40"'):
+            self.assertIn(page, content)
+        for page in ('?page=2"', '?page=16"', '?page=24"', '?page=39"'):
+            self.assertNotIn(page, content)
+        self.assertEqual(content.count('…'), 2)
+
+
+class FeedFragmentCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='fragment_user')
+        cls.group = Group.objects.create(title='Группа', slug='fragment')
+        cls.post = Post.objects.create(
+            text='Старый текст', author=cls.user, group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_feed_skips_queries_until_post_written(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'fragment'}),
+            reverse('posts:profile', kwargs={'username': 'fragment_user'}),
+        )
+        for url in urls:
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(urls[0])
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Новый текст')
+                self.assertNotContains(response, 'Старый текст')
+        self.post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'Новый текст')
+
+    def test_group_changes_retire_cached_feeds(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'fragment_user'}),
+        )
+        for url in urls:
+            self.assertContains(self.client.get(url), '/group/fragment/')
+        self.group.slug = 'renamed'
+        self.group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, '/group/renamed/')
+                self.assertNotContains(response, '/group/fragment/')
+        self.group.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), '/group/')
+
+    def test_pages_are_cached_separately(self):
+        for _ in range(settings.POST_COUNT):
+            Post.objects.create(text='Свежий пост', author=self.user)
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.assertContains(self.client.get(url + '?page=2'), 'Старый текст')
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='export_user')
+        cls.group = Group.objects.create(title='Группа', slug='export')
+        for i in range(5):
+            Post.objects.create(text=f'Пост, "{i}"\nстрока', author=cls.user,
+                                group=cls.group)
+        Post.objects.create(text='Чужой пост', author=User.objects.create(
+            username='someone'
+        ))
+
+    def test_export_streams_without_building_posts(self):
+        created = []
+
+        def count_instances(**kwargs):
+            created.append(kwargs['instance'])
+
+        post_init.connect(count_instances, sender=Post)
+        self.addCleanup(post_init.disconnect, count_instances, sender=Post)
+        response = self.client.get(reverse(
+            'posts:profile_export', kwargs={'username': 'export_user'}
+        ))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(created, [])
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]['text'], 'Пост, "4"\nстрока')
+        self.assertEqual(records[0]['author'], 'export_user')
+        self.assertEqual(records[0]['group'], 'export')
+
+    def test_group_export_as_csv(self):
+        response = self.client.get(reverse(
+            'posts:group_export', kwargs={'slug': 'export'}
+        ), {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[-1]['text'], 'Пост, "0"\nстрока')
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='api_user', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(title='Группа', slug='api')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.user,
+                                group=cls.group)
+            for i in range(settings.POST_COUNT + 2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.created = []
+        post_init.connect(self.count_instances, sender=Post)
+        self.addCleanup(post_init.disconnect, self.count_instances,
+                        sender=Post)
+
+    def count_instances(self, **kwargs):
+        self.created.append(kwargs['instance'])
+
+    def test_feed_pages_with_cursors(self):
+        response = self.client.get(reverse('posts:api_index'))
+        data = response.json()
+        self.assertEqual(len(data['results']), settings.POST_COUNT)
+        self.assertIsNone(data['previous'])
+        first = data['results'][0]
+        self.assertEqual(first['id'], self.posts[-1].pk)
+        self.assertEqual(first['author'], {
+            'username': 'api_user', 'full_name': 'Лев Толстой'
+        })
+        self.assertEqual(first['group'], 'api')
+        data = self.client.get(reverse('posts:api_index'),
+                               {'cursor': data['next']}).json()
+        self.assertEqual([post['id'] for post in data['results']],
+                         [self.posts[1].pk, self.posts[0].pk])
+        self.assertIsNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+        self.assertEqual(self.created, [])
+
+    def test_group_and_profile_feeds(self):
+        for url in (
+            reverse('posts:api_group_list', kwargs={'slug': 'api'}),
+            reverse('posts:api_profile', kwargs={'username': 'api_user'}),
+        ):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), settings.POST_COUNT)
+        response = self.client.get(
+            reverse('posts:api_group_list', kwargs={'slug': 'missing'})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_post_detail(self):
+        post = self.posts[0]
+        data = self.client.get(reverse(
+            'posts:api_post_detail', kwargs={'post_id': post.pk}
+        )).json()
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual(data['author']['posts_count'], len(self.posts))
+        self.assertEqual(self.created, [])
+        response = self.client.get(reverse(
+            'posts:api_post_detail', kwargs={'post_id': 0}
+        ))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
@@ -0,0 +1,30 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+PAGE_SIZES = (1, 5, 10, 50)
+
+
+class QueryBudgetMixin:
+    """Fail if a page needs more than ``budget`` queries at any page size.
+
+    A fixed budget that holds for every page size is what rules out
+    per-row queries from the templates. The cache is cleared before each
+    request, so every page size is really rendered.
+    """
+
+    def assertQueryBudget(self, url, budget, client=None):
+        client = client or self.client
+        for page_size in PAGE_SIZES:
+            with self.subTest(url=url, page_size=page_size):
+                cache.clear()
+                with override_settings(POST_COUNT=page_size):
+                    with CaptureQueriesContext(connection) as captured:
+                        response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('X-Page-Cache', response)
+                self.assertLessEqual(
+                    len(captured), budget,
+                    '\n'.join(query['sql'] for query in captured)
+                )
@@ -0,0 +1,170 @@
+"""Group and author feeds materialized as timeline tables.
+
+``GroupTimeline`` and ``AuthorTimeline`` hold one ``(feed id, post id,
+pub_date)`` row per post, indexed in feed order. Triggers on
+``posts_post`` write them when a post is created, moved to another group
+or author, or deleted, so ``save()``, ``bulk_create()`` and
+``QuerySet.update()`` are all covered. A feed page is then a range scan
+of the timeline index joined to ``posts_post`` by primary key, instead
+of a filtered sort over the posts table.
+
+With ``POST_SHARDS`` the shards keep no timelines and feeds read the
+posts tables directly.
+"""
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from . import sharding
+from .models import AuthorTimeline, GroupTimeline, Post
+
+TIMELINES = ((GroupTimeline, 'group_id'), (AuthorTimeline, 'author_id'))
+
+
+def schema(table, column):
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON posts_post
+        WHEN new.{column} IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO {table} (post_id, {column}, pub_date)
+            VALUES (new.id, new.{column}, new.pub_date);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_au
+        AFTER UPDATE OF {column}, pub_date ON posts_post
+        WHEN old.{column} IS NOT new.{column}
+            OR old.pub_date IS NOT new.pub_date
+        BEGIN
+            DELETE FROM {table} WHERE post_id = old.id;
+            INSERT INTO {table} (post_id, {column}, pub_date)
+            SELECT new.id, new.{column}, new.pub_date
+            WHERE new.{column} IS NOT NULL;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON posts_post
+        WHEN old.{column} IS NOT NULL
+        BEGIN
+            DELETE FROM {table} WHERE post_id = old.id;
+        END""",
+    ]
+
+
+# Rows of one post id range that are absent from the timeline, or that
+# the timeline has but the posts table no longer agrees with.
+MISSING = """FROM posts_post p
+    WHERE p.id BETWEEN %s AND %s AND p.{column} IS NOT NULL
+    AND NOT EXISTS (
+        SELECT 1 FROM {table} t WHERE t.post_id = p.id
+        AND t.{column} = p.{column} AND t.pub_date = p.pub_date
+    )"""
+STALE = """FROM {table} t
+    WHERE t.post_id BETWEEN %s AND %s
+    AND NOT EXISTS (
+        SELECT 1 FROM posts_post p WHERE p.id = t.post_id
+        AND p.{column} = t.{column} AND p.pub_date = t.pub_date
+    )"""
+
+
+def enabled():
+    return settings.POST_TIMELINES and not sharding.enabled()
+
+
+def group_posts(group_id):
+    """Feed posts of a group, newest first."""
+    if enabled():
+        return GroupTimeline.objects.filter(group_id=group_id).posts()
+    return Post.objects.for_feed().filter(group_id=group_id).sharded()
+
+
+def author_posts(author_id):
+    """Feed posts of an author, newest first."""
+    if enabled():
+        return AuthorTimeline.objects.filter(author_id=author_id).posts()
+    return Post.objects.for_feed().of_author(author_id)
+
+
+def install(using='default'):
+    """Create the triggers; fill the timelines if they are new."""
+    connection = connections[using]
+    if (connection.vendor != 'sqlite'
+            or not router.allow_migrate_model(using, GroupTimeline)):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        triggers = {name for name, in cursor.fetchall()}
+        created = False
+        for model, column in TIMELINES:
+            table = model._meta.db_table
+            created |= f'{table}_ai' not in triggers
+            for statement in schema(table, column):
+                cursor.execute(statement)
+    if created:
+        for _ in scan(using, fix=True):
+            pass
+    return True
+
+
+def scan(using='default', batch_size=10000, fix=False):
+    """Compare the timelines with ``posts_post``, one id range at a time.
+
+    Yields ``(last post id, {table: (missing, stale)})`` per range. With
+    ``fix`` the stale rows are deleted and the missing ones written, each
+    range in its own short transaction, so the site keeps serving while a
+    large table is repaired.
+    """
+    tables = [model._meta.db_table for model, _ in TIMELINES]
+    with connections[using].cursor() as cursor:
+        cursor.execute(' UNION ALL '.join(
+            ['SELECT MIN(id), MAX(id) FROM posts_post'] + [
+                f'SELECT MIN(post_id), MAX(post_id) FROM {table}'
+                for table in tables
+            ]
+        ))
+        bounds = cursor.fetchall()
+    lows = [low for low, _ in bounds if low is not None]
+    highs = [high for _, high in bounds if high is not None]
+    if not lows:
+        return
+    for start in range(min(lows), max(highs) + 1, batch_size):
+        end = start + batch_size - 1
+        yield end, _scan_range(using, start, end, fix)
+
+
+def check(using='default', batch_size=10000):
+    """``{table: (missing, stale)}`` over all posts."""
+    totals = {}
+    for _, found in scan(using, batch_size):
+        for table, (missing, stale) in found.items():
+            total_missing, total_stale = totals.get(table, (0, 0))
+            totals[table] = (total_missing + missing, total_stale + stale)
+    return totals
+
+
+def _scan_range(using, start, end, fix):
+    found = {}
+    with transaction.atomic(using), connections[using].cursor() as cursor:
+        for model, column in TIMELINES:
+            table = model._meta.db_table
+            missing = MISSING.format(table=table, column=column)
+            stale = STALE.format(table=table, column=column)
+            if fix:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE post_id IN '
+                    f'(SELECT t.post_id {stale})', [start, end]
+                )
+                stale_count = cursor.rowcount
+                cursor.execute(
+                    f'INSERT OR REPLACE INTO {table} '
+                    f'(post_id, {column}, pub_date) '
+                    f'SELECT p.id, p.{column}, p.pub_date {missing}',
+                    [start, end]
+                )
+                missing_count = cursor.rowcount
+            else:
+                cursor.execute(f'SELECT COUNT(*) {stale}', [start, end])
+                stale_count = cursor.fetchone()[0]
+                cursor.execute(f'SELECT COUNT(*) {missing}', [start, end])
+                missing_count = cursor.fetchone()[0]
+            found[table] = (missing_count, stale_count)
+    return found
+
+
+def install_timelines(sender, using='default', **kwargs):
+    install(using)
@@ -0,0 +1,82 @@
+"""Bring a database made by an older ``migrate --run-syncdb`` up to date.
+
+The posts app has no usable migrations, and syncdb only creates tables
+that do not exist yet. Columns and indexes added to an existing table
+are created here instead, and a new column is then filled in. Each step
+checks the schema first, so ``upgrade()`` can run any number of times;
+it also runs after every ``migrate``.
+"""
+from django.apps import apps
+from django.db import connections, router
+
+from . import counters
+from .models import Post
+
+
+def recount(using):
+    counters.recount()
+
+
+def render(using):
+    Post.objects.using(using).render_stored()
+
+
+# Columns added to existing tables, with what fills them in once added.
+COLUMNS = [
+    ('Group', 'posts_count', recount),
+    ('Post', 'text_html', render),
+    ('Post', 'excerpt', render),
+]
+
+
+def upgrade(using='default'):
+    """Create what the schema lacks; returns the names of what was added."""
+    connection = connections[using]
+    editor = connection.schema_editor()
+    added = []
+    fill = []
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        for model_name, name, then in COLUMNS:
+            model = apps.get_model('posts', model_name)
+            table = model._meta.db_table
+            if (table not in tables
+                    or not router.allow_migrate_model(using, model)):
+                continue
+            columns = {column.name for column in connection.introspection
+                       .get_table_description(cursor, table)}
+            field = model._meta.get_field(name)
+            if field.column in columns:
+                continue
+            definition, params = editor.column_sql(model, field,
+                                                   include_default=True)
+            cursor.execute(
+                f'ALTER TABLE {editor.quote_name(table)} ADD COLUMN '
+                f'{editor.quote_name(field.column)} '
+                + definition % tuple(map(editor.quote_value, params))
+            )
+            added.append(f'{table}.{field.column}')
+            if then not in fill:
+                fill.append(then)
+        for model in apps.get_app_config('posts').get_models():
+            table = model._meta.db_table
+            if (table not in tables
+                    or not router.allow_migrate_model(using, model)):
+                continue
+            existing = connection.introspection.get_constraints(
+                cursor, table
+            )
+            for index in model._meta.indexes:
+                if index.name in existing:
+                    continue
+                sql = str(index.create_sql(model, editor))
+                cursor.execute(sql.replace('CREATE INDEX',
+                                           'CREATE INDEX IF NOT EXISTS', 1))
+                added.append(index.name)
+    for then in fill:
+        then(using)
+    return added
+
+
+def upgrade_schema(sender, using='default', **kwargs):
+    upgrade(using)
@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from .models import Post
+from .paginators import (CachedCountPaginator, CursorPaginator,
+                         EstimatedCountPaginator)
+from .sharding import MergedQuerySet
+
+PAGINATORS = {
+    'cached': CachedCountPaginator,
+    'estimate': EstimatedCountPaginator,
+}
+
+
+def pagination_mode(request):
+    modes = settings.POST_PAGINATION
+    match = request.resolver_match
+    view_name = match.view_name if match else None
+    return modes.get(view_name, modes['default'])
+
+
+def paginate(request, queryset, feed=None):
+    cursor = request.GET.get('cursor')
+    mode = pagination_mode(request)
+    # Page numbers would need OFFSET on every shard, so merged feeds are
+    # always paginated by cursor.
+    if (cursor is not None or mode == 'cursor'
+            or isinstance(queryset, MergedQuerySet)):
+        paginator = CursorPaginator(queryset, settings.POST_COUNT, feed=feed)
+        return paginator.get_page(cursor)
+    if mode in PAGINATORS and feed is not None:
+        paginator = PAGINATORS[mode](queryset, settings.POST_COUNT, feed)
+    else:
+        paginator = Paginator(queryset, settings.POST_COUNT)
+    return paginator.get_page(request.GET.get('page'))
+
+
+@contextmanager
+def keep_pub_date():
+    """Let bulk writes store their own ``Post.pub_date`` values.
+
+    ``auto_now_add`` overwrites the field even in ``bulk_create``, so it is
+    switched off for the duration of the block.
+    """
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
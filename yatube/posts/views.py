@@ -1,58 +1,105 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
 
+from core.routers import read_from_replica
 from posts.forms import PostForm
-from yatube import settings
 
-from .models import Group, Post, User
+from . import sharding, timelines
+from .decorators import cache_anonymous_page, feed_condition
+from .exports import CONTENT_TYPES, export_lines
+from .feeds import feed_key, fragment_cache
+from .models import AuthorStats, Group, Post, User
+from .paginators import CursorPaginator
+from .utils import paginate
 
 
+def group_feed(slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return None if group_id is None else feed_key(group_id=group_id)
+
+
+def author_feed(username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return None if author_id is None else feed_key(author_id=author_id)
+
+
+def post_feed(post_id):
+    post = Post.objects.of_post(post_id).order_by().values_list(
+        'author_id', flat=True
+    )
+    if not post:
+        return None
+    return feed_key(author_id=post[0])
+
+
+@read_from_replica
+@feed_condition(lambda: feed_key())
+@cache_anonymous_page
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.POST_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    feed = feed_key()
+    post_list = Post.objects.for_feed().sharded()
+    page_obj = paginate(request, post_list, feed)
     context = {
         'page_obj': page_obj,
+        'feed_cache': fragment_cache(feed),
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@feed_condition(group_feed)
+@cache_anonymous_page
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    page_number = request.GET.get('page')
-    post_list = Post.objects.filter(group=group)
-    paginator = Paginator(post_list, settings.POST_COUNT)
-    page_obj = paginator.get_page(page_number)
+    feed = feed_key(group_id=group.pk)
+    post_list = timelines.group_posts(group.pk)
+    page_obj = paginate(request, post_list, feed)
     context = {
         'title': f'Записи сообщества {slug}',
         'group': group,
         'page_obj': page_obj,
+        'feed_cache': fragment_cache(feed),
     }
     return render(request, template, context)
 
 
+@read_from_replica
+@feed_condition(author_feed)
+@cache_anonymous_page
 def profile(request, username):
-    user_profile = get_object_or_404(User, username=username)
-    user_posts = Post.objects.filter(author=user_profile)
-    posts_count = user_posts.count()
-    paginator = Paginator(user_posts, settings.POST_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    user_profile = get_object_or_404(
+        User.objects.select_related('post_stats'), username=username
+    )
+    feed = feed_key(author_id=user_profile.pk)
+    user_posts = timelines.author_posts(user_profile.pk)
+    page_obj = paginate(request, user_posts, feed)
+    posts_count = AuthorStats.posts_count_of(user_profile)
     context = {
         'author': user_profile,
         'page_obj': page_obj,
         'count': posts_count,
+        'feed_cache': fragment_cache(feed),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@read_from_replica
+@feed_condition(post_feed)
+@cache_anonymous_page
 def post_detail(request, post_id):
-    user_post = get_object_or_404(Post, pk=post_id)
-    posts = Post.objects.filter(author_id=user_post.author_id)
-    posts_count = posts.count()
+    user_post = get_object_or_404(
+        Post.objects.with_related('author__post_stats', 'group')
+        .of_post(post_id)
+    )
+    posts_count = AuthorStats.posts_count_of(user_post.author)
     context = {
         'post': user_post,
         'posts_count': posts_count,
@@ -60,6 +107,54 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_anonymous_page
+def search(request):
+    query = request.GET.get('q', '').strip()
+    if sharding.enabled():
+        # Every shard ranks against its own index, so the scores cannot be
+        # merged; matches come newest first instead.
+        post_list = Post.objects.for_feed().search(query, ranked=False)
+        paginator = CursorPaginator(post_list.sharded(), settings.POST_COUNT)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        post_list = Post.objects.for_feed().search(query)
+        paginator = Paginator(post_list, settings.POST_COUNT)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def export_response(queryset, request, filename):
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in CONTENT_TYPES:
+        fmt = 'ndjson'
+    response = StreamingHttpResponse(
+        export_lines(queryset, fmt), content_type=CONTENT_TYPES[fmt]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename}.{fmt}"'
+    )
+    return response
+
+
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(
+        Post.objects.filter(group=group), request, f'group-{group.slug}'
+    )
+
+
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    return export_response(
+        Post.objects.filter(author=author), request,
+        f'profile-{author.username}'
+    )
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None)
@@ -73,7 +168,7 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.of_post(post_id))
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post.pk)
     form = PostForm(request.POST or None, instance=post)
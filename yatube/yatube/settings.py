@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,6 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.timing.ServerTimingMiddleware',
+    'core.slow_queries.SlowQueryLogMiddleware',
+    'core.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -57,7 +66,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,11 +89,65 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 60,
+    },
 }
 
+# Шарды постов: посты автора лежат в POST_SHARDS[crc32(author_id) % N].
+# Пустой список — все посты в default. Схема шарда создаётся командой
+# manage.py migrate --run-syncdb --database posts_shard_0; шарды начинают
+# с пустых таблиц. Таблиц пользователей и групп в шардах нет, поэтому
+# внешние ключи там не проверяются.
+POST_SHARD_DATABASES = ['posts_shard_0', 'posts_shard_1']
+for _index, _alias in enumerate(POST_SHARD_DATABASES):
+    DATABASES[_alias] = {
+        'ENGINE': 'core.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.shard{_index}.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'PRAGMAS': {'foreign_keys': 'OFF'},
+    }
+del _index, _alias
+POST_SHARDS = []
+
+# Реплики для чтения лент и постов: алиасы из DATABASES. Для локальной
+# проверки подойдёт копия файла, которую обновляет manage.py sync_replicas:
+# DATABASES['replica'] = {
+#     'ENGINE': 'core.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+#     'TEST': {'MIRROR': 'default'},
+# }
+# DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['posts.sharding.ShardRouter',
+                    'core.routers.ReplicaRouter']
+# После записи клиент столько секунд читает с основной базы.
+REPLICA_PIN_SECONDS = 10
+
+
+# Кеш в два уровня: LRU в памяти каждого процесса перед общим файловым
+# кешем. Запись меняет метку своей корзины ключей в общем кеше, и
+# остальные процессы раз в SYNC_INTERVAL секунд выбрасывают копии из
+# изменившихся корзин; локальная копия живёт не дольше LOCAL_TIMEOUT
+# секунд. Файловый кеш core.cache.FileCache делает add() под блокировкой,
+# на нём держатся блокировки кеша страниц и поколения лент.
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TwoLevelCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            'SYNC_INTERVAL': 0.5,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.FileCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -137,3 +200,120 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POST_COUNT = 10
+
+# Режим пагинации лент по имени view:
+# 'exact' — ?page=N с COUNT(*) на каждый запрос,
+# 'cached' — ?page=N, число постов берётся из кеша,
+# 'estimate' — ?page=N, для общей ленты число постов оценивается по max(id),
+# 'cursor' — keyset-пагинация по ?cursor=.
+# Ссылки с ?cursor= работают в любом режиме.
+POST_PAGINATION = {
+    'default': 'exact',
+    'posts:index': 'cached',
+    'posts:group_list': 'cached',
+    'posts:profile': 'cached',
+}
+
+POST_COUNT_CACHE_TIMEOUT = 60 * 5
+
+# Отрисованный список постов ленты; сбрасывается при записи поста.
+POST_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Ленты групп и авторов читаются из таблиц-таймлайнов, которые триггеры
+# обновляют при записи поста. Перестроение: manage.py rebuild_timelines,
+# проверка: manage.py check_timelines.
+POST_TIMELINES = True
+
+# Страницы лент и постов для анонимных читателей: столько секунд страница
+# свежая, и ещё столько её можно отдавать, пока один воркер её пересобирает.
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 30
+ANONYMOUS_PAGE_CACHE_STALE = 60 * 5
+
+# SQL-запросы дольше SLOW_QUERY_THRESHOLD_MS миллисекунд пишутся в
+# SLOW_QUERY_LOG_FILE вместе с view и планом; None выключает журнал.
+# Сводка по журналу: manage.py slow_queries.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG_FILE = os.path.join(BASE_DIR, 'slow_queries.log')
+
+# Метрики Prometheus на /metrics. Каждый процесс сбрасывает свои счётчики
+# в METRICS_DIR не чаще раза в METRICS_FLUSH_INTERVAL секунд, /metrics
+# складывает файлы всех процессов, а файлы завершившихся сводит в один
+# архив.
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 1
+
+# Профилирование view через cProfile: доля случайных запросов и запросы
+# с заголовком X-Profile: <PROFILING_TOKEN>. Хранятся последние
+# PROFILING_KEEP профилей, список для персонала — /admin/profiles/.
+PROFILING_SAMPLE_RATE = 0
+PROFILING_TOKEN = None
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_KEEP = 200
+
+# PRAGMA для каждого нового соединения с SQLite (бэкенд core.sqlite3).
+# WAL даёт читать во время записи, busy_timeout — ждать блокировку, а не
+# падать сразу, synchronous=NORMAL в режиме WAL безопасен и не делает
+# fsync на каждый коммит.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Запросы вне транзакции, упавшие с "database is locked", повторяются
+# столько раз с удвоением паузы от SQLITE_LOCK_BACKOFF секунд.
+SQLITE_LOCK_RETRIES = 5
+SQLITE_LOCK_BACKOFF = 0.05
+
+# Тайминги запросов: заголовок Server-Timing и JSON-строка в лог
+# yatube.timing на каждый запрос.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'timing': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'encoding': 'utf-8',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.timing': {
+            'handlers': ['timing'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Настройки для manage.py test и pytest: лог таймингов молчит, чтобы не
+# печатать строку на каждый запрос тестов, метрики пишутся во временный
+# каталог, который удаляется после запуска, а общий кеш живёт в памяти,
+# чтобы cache.clear() в тестах не трогал кеш запущенного сайта.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-tests',
+    }
+    LOGGING['loggers']['yatube.timing']['level'] = 'WARNING'
+    METRICS_DIR = tempfile.mkdtemp(prefix='yatube-metrics-')
+    atexit.register(shutil.rmtree, METRICS_DIR, ignore_errors=True)
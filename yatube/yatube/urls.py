@@ -16,10 +16,17 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from core.metrics import metrics_view
+from core.profiling import profile_download, profile_list
+
 urlpatterns = [
     path('', include('posts.urls')),
+    path('admin/profiles/', profile_list, name='profile_list'),
+    path('admin/profiles/<str:name>', profile_download,
+         name='profile_download'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', metrics_view, name='metrics'),
 ]